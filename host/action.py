@@ -1,92 +1,209 @@
 import os
-import time
-import requests
 from dotenv import load_dotenv
-from elevenlabs.client import ElevenLabs
-from elevenlabs import play
+from playback import get_engine
+from clients import get_session, get_elevenlabs
+from tts_cache import PhraseCache, phrase_key
+from navigation import Navigator
+from speculation import get_speculator
+from geo_cache import get_maps_cache, places_key, route_key, PLACES_TTL, ROUTE_TTL
+from tracing import traced
+from concurrent.futures import ThreadPoolExecutor
 import os
 import re
+import logging
+import threading
 import multiprocessing
 
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
 google_maps_api_key = os.getenv("GOOGLE_MAPS_API_KEY")
+# MAPS_API_URL points both endpoints at another server, e.g. fake_maps_server.py
+GEOLOCATION_URL = os.getenv("MAPS_API_URL", "https://www.googleapis.com") + "/geolocation/v1/geolocate"
+MAPS_URL = os.getenv("MAPS_API_URL", "https://maps.googleapis.com") + "/maps/api"
+
+VOICE_ID = "JBFqnCBsd6RMkjVDRZzb"
+MODEL_ID = "eleven_flash_v2_5"
+OUTPUT_FORMAT = "pcm_24000"
+# How the playback engine reads these bytes: "pcm" or "mp3"
+PLAYBACK_FORMAT = OUTPUT_FORMAT.split("_")[0]
+
+# Route steps are synthesized in parallel as soon as the route arrives
+_synth_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tts-prefetch")
+_phrases = None
+_phrases_lock = threading.Lock()
+
+
+def get_phrase_cache():
+    global _phrases
+    with _phrases_lock:
+        if _phrases is None:
+            _phrases = PhraseCache(os.getenv("TTS_CACHE_DIR", ".tts_cache"))
+        return _phrases
+
+
+_navigator = None
+_navigator_lock = threading.Lock()
+
+
+def get_navigator():
+    # One active route per process; NAV_ADVANCE=location advances on position instead of step durations
+    global _navigator
+    with _navigator_lock:
+        if _navigator is None:
+            actions = Action()
+            _navigator = Navigator(
+                play=lambda audio: actions.play(audio, priority=1),
+                locate=actions.locate,
+                advance=os.getenv("NAV_ADVANCE", "time"),
+            )
+        return _navigator
+
+
 class Action:
     
     def __init__(self):
-        self.client = ElevenLabs(
-            api_key=os.getenv("ELEVEL_LABS_API_KEY"),
-        )
-        pass
+        # Shared, long-lived clients: connections stay warm across queries
+        self.client = get_elevenlabs()
+        self.session = get_session()
+        self.phrases = get_phrase_cache()
+        self.maps_cache = get_maps_cache()
 
-    def tts(self, text):
-        audio = self.client.text_to_speech.convert(
+    def _convert(self, text):
+        # Raw 24 kHz PCM plays straight into the output stream, no MP3 decode
+        return self.client.text_to_speech.convert(
             text=text,
-            voice_id="JBFqnCBsd6RMkjVDRZzb",
-            model_id="eleven_flash_v2_5",
-            output_format="mp3_44100_128",
+            voice_id=VOICE_ID,
+            model_id=MODEL_ID,
+            output_format=OUTPUT_FORMAT,
         )
 
-        play(audio)
+    def _key(self, text):
+        return phrase_key(text, VOICE_ID, MODEL_ID, OUTPUT_FORMAT)
+
+    @traced("tts.synthesize")
+    def synthesize(self, text):
+        key = self._key(text)
+        audio = self.phrases.get(key)
+        if audio is None:
+            audio = b"".join(self._convert(text))
+            self.phrases.put(key, audio)
+        return audio
+
+    def prefetch(self, texts):
+        """
+        Synthesize several phrases concurrently; returns a future per text.
+        """
+        return [_synth_pool.submit(self.synthesize, text) for text in texts]
+
+    @traced("playback")
+    def play(self, audio, priority=0, preempt=False):
+        get_engine().play(audio, priority=priority, preempt=preempt, format=PLAYBACK_FORMAT)
+
+    @traced("tts.speak")
+    def tts(self, text, priority=0, preempt=False):
+        key = self._key(text)
+        audio = self.phrases.get(key)
+        if audio is not None:
+            self.play(audio, priority=priority, preempt=preempt)
+            return
+        # Start speaking as soon as the first audio chunk arrives, keeping a copy for the cache
+        chunks = []
+
+        def collect():
+            for chunk in self._convert(text):
+                chunks.append(chunk)
+                yield chunk
+
+        clip = get_engine().stream_chunks(collect(), priority=priority, preempt=preempt, format=PLAYBACK_FORMAT)
+        if not clip.cancelled:
+            self.phrases.put(key, b"".join(chunks))
         
+    @traced("action.get_current_location")
     def get_current_location(self):
-        url = f"https://www.googleapis.com/geolocation/v1/geolocate?key={google_maps_api_key}"
+        # Started at trigger time while the user was still speaking, if at all
+        location = get_speculator().take("location")
+        if location is not None:
+            return location
+        return self.locate()
+
+    @traced("action.locate")
+    def locate(self):
+        # Reuse the last fix until the user has probably moved
+        location = self.maps_cache.current_location()
+        if location is not None:
+            return location
+        url = f"{GEOLOCATION_URL}?key={google_maps_api_key}"
         payload = {"considerIp": "true"}
-        response = requests.post(url, json=payload)
+        response = self.session.post(url, json=payload)
         if response.status_code == 200:
             data = response.json()
+            self.maps_cache.remember_location(data.get("location"))
             return data.get("location")
         else:
             raise Exception(f"Error: {response.status_code} - {response.text}")
 
+    def _maps_get(self, url, params, key, ttl):
+        """
+        GET a Maps endpoint through the spatial cache; only OK answers are cached.
+        """
+        data = self.maps_cache.get(key)
+        if data is not None:
+            return data
+        response = self.session.get(url, params=params)
+        if response.status_code != 200:
+            raise Exception(f"HTTP error: {response.status_code} - {response.text}")
+        data = response.json()
+        if data.get("status") == "OK":
+            self.maps_cache.put(key, data, ttl)
+        return data
+
+    @traced("action.get_route_to_destination")
     def get_route_to_destination(self,origin, destination):
-        print("started")
+        log.debug("started")
         mode = "walking"
-        url = "https://maps.googleapis.com/maps/api/directions/json"
+        url = f"{MAPS_URL}/directions/json"
         params = {
             "origin": origin,
             "destination": destination,
             "mode": mode,
             "key": google_maps_api_key
         }
-        response = requests.get(url, params=params)
-        
+        data = self._maps_get(url, params, route_key(origin, destination, mode), ROUTE_TTL)
         
-        if response.status_code == 200:
-            data = response.json()
+        if data.get("status") == "OK":
+            route = data["routes"][0]
+            leg = route["legs"][0]
+            steps = leg["steps"]
+            
+            # Plain-text instructions, synthesized all at once as soon as the route arrives
+            instructions_list = [re.sub('<.*?>', '', step.get("html_instructions", "")) for step in steps]
+            audio = self.prefetch(instructions_list)
+            for instruction in instructions_list:
+                log.debug(instruction)
+
+            # The navigator speaks each step in the background; the agent is free straight away
+            get_navigator().start(destination, [
+                {
+                    "instruction": instruction,
+                    "duration": step["duration"]["value"],
+                    "distance": step["distance"]["value"],
+                    "end_location": step.get("end_location"),
+                    "audio": clip,
+                }
+                for step, instruction, clip in zip(steps, instructions_list, audio)
+            ])
+            return instructions_list
             
-            if data.get("status") == "OK":
-                route = data["routes"][0]
-                leg = route["legs"][0]
-                steps = leg["steps"]
-                
-                instructions_list = []
-                for step in steps:
-                    # Get the HTML instructions and convert to plain text.
-                    html_instruction = step.get("html_instructions", "")
-                    instruction = re.sub('<.*?>', '', html_instruction)
-                
-                    print(instruction)
-
-                    self.tts(instruction)
-                    
-                    #call audio function
-                    instructions_list.append(instruction)
-                    duration_seconds = step["duration"]["value"]
-                    print(duration_seconds)
-                    time.sleep(duration_seconds)
-                
-                return instructions_list
-                
-            else:
-                error_message = data.get("error_message", "Unknown error")
-                raise Exception(f"Google Maps API error: {data.get('status')} - {error_message}")
         else:
-            raise Exception(f"HTTP error: {response.status_code} - {response.text}")
+            error_message = data.get("error_message", "Unknown error")
+            raise Exception(f"Google Maps API error: {data.get('status')} - {error_message}")
         
+    @traced("action.get_nearby_places")
     def get_nearby_places(self, location, place_type, radius=1000):
 
-        url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+        url = f"{MAPS_URL}/place/nearbysearch/json"
         if isinstance(location, tuple):
             location = f"{location[0]},{location[1]}"
         params = {
@@ -95,18 +212,13 @@ class Action:
             "type": place_type,
             "key": google_maps_api_key
         }
-        response = requests.get(url, params=params)
-        
+        # Keyed by geohash cell, so a nearby repeat of the same search hits
+        data = self._maps_get(url, params, places_key(location, place_type, radius), PLACES_TTL)
         
-        
-        if response.status_code == 200:
-            data = response.json()
-            if data.get("status") == "OK":
-                for place in data.get("results", []): 
-                    print(f"- {place.get('name')} , {place.get('vicinity')}")
-                return data
-            else:
-                error_message = data.get("error_message", "Unknown error")
-                raise Exception(f"Google Places API error: {data.get('status')} - {error_message}")
+        if data.get("status") == "OK":
+            for place in data.get("results", []): 
+                log.debug("- %s , %s", place.get('name'), place.get('vicinity'))
+            return data
         else:
-            raise Exception(f"HTTP error: {response.status_code} - {response.text}")
\ No newline at end of file
+            error_message = data.get("error_message", "Unknown error")
+            raise Exception(f"Google Places API error: {data.get('status')} - {error_message}")
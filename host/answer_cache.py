@@ -0,0 +1,173 @@
+import base64
+import os
+import re
+import threading
+import time
+import cv2
+import numpy as np
+
+# Words that don't change what is being asked
+STOPWORDS = {
+    "a", "an", "the", "me", "my", "i", "you", "please", "can", "could", "would", "will", "tell",
+    "us", "is", "are", "what", "what's", "whats", "there", "this", "that", "of", "to", "in", "on",
+    "at", "for", "now", "again", "just", "do", "does", "see", "it", "here", "hey", "so",
+    # Describing is the default for a question about the camera view
+    "describe", "description", "explain", "show", "look", "like",
+}
+
+# Different wordings of the same question
+SYNONYMS = {
+    "around": "surroundings", "surrounding": "surroundings", "nearby": "surroundings",
+    "front": "ahead", "ahead": "ahead",
+    "read": "read", "says": "read", "say": "read", "written": "read", "text": "read",
+    "sign": "sign", "signs": "sign", "board": "sign",
+}
+
+# Question phrasing: may differ between two wordings of one question. Every
+# other word (people, cars, door, red, ...) names what is asked about and
+# has to match exactly.
+QUESTION_WORDS = {
+    "how", "many", "much", "where", "which", "who", "why", "when", "any", "anything", "something",
+    "some", "all", "everything", "kind", "get", "got", "have", "has",
+}
+
+TOKEN = re.compile(r"[a-z']+")
+
+
+def normalize_query(query):
+    """
+    The set of content words in a query, with synonyms folded together, so
+    "what's around me?" and "describe my surroundings" compare as close.
+    """
+    words = (SYNONYMS.get(w, w) for w in TOKEN.findall(query.lower()) if w not in STOPWORDS)
+    return frozenset(words)
+
+
+def subject(words):
+    """
+    The words of a normalised query that say what is asked about.
+
+    >>> people, cars = "how many people are in front of me", "how many cars are in front of me"
+    >>> subject(normalize_query(people)) == subject(normalize_query(cars))
+    False
+    >>> subject(normalize_query("what's around me?")) == subject(normalize_query("describe my surroundings"))
+    True
+    """
+    return words - QUESTION_WORDS
+
+
+def phash(image):
+    """
+    64-bit perceptual hash of a base64 JPEG (or {"image": ...} dict): the
+    sign of the lowest 8x8 DCT coefficients of a 32x32 grayscale thumbnail.
+    Small shifts, recompression and exposure noise flip only a few bits.
+    """
+    original = image["image"] if isinstance(image, dict) else image
+    frame = cv2.imdecode(np.frombuffer(base64.b64decode(original), np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if frame is None:
+        return None
+    small = cv2.resize(frame, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].reshape(-1)
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class AnswerCache:
+    """
+    Spoken answers to image questions, reused while the scene and the
+    question stay the same.
+
+    A lookup hits when an entry younger than `ttl` seconds has every frame
+    within `max_distance` bits of one of the new frames' perceptual hashes
+    and a query about exactly the same things (see subject()) whose
+    normalised words overlap by at least `min_similarity` (Jaccard), so
+    only the phrasing may differ: "how many cars ..." never answers "how
+    many people ...". invalidate() drops everything, e.g. after the user
+    has started moving.
+    """
+
+    def __init__(self, ttl=30, max_distance=8, min_similarity=0.6, max_items=64):
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.min_similarity = min_similarity
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._entries = []
+        self._lock = threading.Lock()
+
+    def _scene_matches(self, hashes, cached):
+        if not hashes or not cached:
+            return False
+        return all(min(hamming(c, h) for h in hashes) <= self.max_distance for c in cached)
+
+    @staticmethod
+    def _similarity(a, b):
+        if not a and not b:
+            return 1.0
+        return len(a & b) / len(a | b)
+
+    def lookup(self, images, query, max_age=None):
+        """
+        The cached answer for this scene and question, or None.
+        max_age tightens the TTL for this one lookup.
+        """
+        hashes = [h for h in (phash(image) for image in images) if h is not None]
+        words = normalize_query(query)
+        about = subject(words)
+        now = time.monotonic()
+        max_age = self.ttl if max_age is None else min(max_age, self.ttl)
+        with self._lock:
+            fresh = [e for e in self._entries if now - e["time"] <= self.ttl]
+            self.expired += len(self._entries) - len(fresh)
+            self._entries = fresh
+            best = None
+            for entry in fresh:
+                if now - entry["time"] > max_age or not self._scene_matches(hashes, entry["hashes"]):
+                    continue
+                if subject(entry["words"]) != about:
+                    continue
+                similarity = self._similarity(words, entry["words"])
+                if similarity >= self.min_similarity and (best is None or similarity > best[0]):
+                    best = (similarity, entry)
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return best[1]["answer"]
+
+    def store(self, images, query, answer):
+        hashes = [h for h in (phash(image) for image in images) if h is not None]
+        if not answer or not hashes:
+            return
+        with self._lock:
+            self._entries.append({"time": time.monotonic(), "hashes": hashes,
+                                  "words": normalize_query(query), "answer": answer})
+            self._entries = self._entries[-self.max_items:]
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = []
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "expired": self.expired,
+                    "entries": len(self._entries)}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    # ANSWER_CACHE_TTL=0 turns the cache off
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnswerCache(ttl=float(os.getenv("ANSWER_CACHE_TTL", "30")))
+        return _cache
@@ -0,0 +1,303 @@
+import io
+import logging
+import queue
+import threading
+import time
+import numpy as np
+import sounddevice as sd
+import soundfile as sf
+
+log = logging.getLogger(__name__)
+
+
+class Endpointer:
+    """
+    Energy-based voice activity endpointer.
+
+    Feed it successive blocks of samples; it calibrates a noise floor from
+    the first `calibration` seconds (unless `floor_db` is given up front),
+    treats blocks `margin_db` above that floor as speech, and reports done once speech was followed by
+    `hangover` seconds of silence, after `max_length` seconds in total, or
+    after `no_speech_timeout` seconds without any speech at all.
+    """
+
+    def __init__(self, fs, hangover=0.6, max_length=10.0, no_speech_timeout=5.0,
+                 margin_db=12.0, calibration=0.2, min_floor_db=-70.0, floor_db=None):
+        self.fs = fs
+        self.hangover = hangover
+        self.max_length = max_length
+        self.no_speech_timeout = no_speech_timeout
+        self.margin_db = margin_db
+        self.calibration = calibration
+        self.min_floor_db = min_floor_db
+
+        self.elapsed = 0.0
+        self.speech_started = None
+        self.last_speech = None
+        self._calibration_levels = []
+        self.floor_db = None if floor_db is None else max(floor_db, min_floor_db)
+
+    @staticmethod
+    def level_db(block):
+        block = np.asarray(block, dtype=np.float32)
+        if block.ndim > 1:
+            block = block.mean(axis=1)
+        return 20 * np.log10(np.sqrt(np.mean(block * block)) + 1e-10)
+
+    def push(self, block):
+        """
+        Process one block; returns True once recording should stop.
+        """
+        level = self.level_db(block)
+        self.elapsed += len(block) / self.fs
+
+        if self.floor_db is None:
+            self._calibration_levels.append(level)
+            if self.elapsed >= self.calibration:
+                self.floor_db = max(float(np.median(self._calibration_levels)), self.min_floor_db)
+            return False
+
+        if level > self.floor_db + self.margin_db:
+            if self.speech_started is None:
+                self.speech_started = self.elapsed
+            self.last_speech = self.elapsed
+
+        if self.elapsed >= self.max_length:
+            return True
+        if self.last_speech is None:
+            return self.elapsed >= self.no_speech_timeout
+        return self.elapsed - self.last_speech >= self.hangover
+
+
+def record_until_silence(fs=44100, channels=2, block_duration=0.02, on_audio=None, **endpointer_args):
+    """
+    Record from the default input until the endpointer says the user has
+    stopped talking. Returns a (samples, channels) float32 array.
+
+    on_audio, if given, is called with every block as it is recorded.
+    """
+    endpointer = Endpointer(fs, **endpointer_args)
+    blocks = queue.Queue()
+    # No logging on the PortAudio thread: status flags are reported afterwards
+    statuses = []
+
+    def callback(indata, frames, time_info, status):
+        if status:
+            statuses.append(status)
+        blocks.put(indata.copy())
+
+    recorded = []
+    with sd.InputStream(samplerate=fs, channels=channels, dtype="float32",
+                        blocksize=int(fs * block_duration), callback=callback):
+        while True:
+            block = blocks.get()
+            recorded.append(block)
+            if on_audio is not None:
+                on_audio(block)
+            if endpointer.push(block):
+                break
+
+    if statuses:
+        log.warning("Audio input status: %s (%d blocks)", statuses[-1], len(statuses))
+    log.debug("Recorded %.2f s (speech ended at %.2f s)", endpointer.elapsed, endpointer.last_speech or 0)
+    return np.concatenate(recorded)
+
+
+class AudioRing:
+    """
+    Fixed-size NumPy ring holding the last `seconds` of audio.
+
+    Positions are absolute frame counts since the ring was created; write()
+    copies into the preallocated array (no per-chunk allocation) and
+    readers get views of any range still inside the ring.
+    """
+
+    def __init__(self, seconds, fs, channels):
+        self.fs = fs
+        self.data = np.zeros((int(seconds * fs), channels), dtype=np.float32)
+        self.written = 0
+        self._cond = threading.Condition()
+
+    def write(self, block):
+        size = len(self.data)
+        count = len(block)
+        if count > size:
+            block = block[-size:]
+        start = (self.written + count - len(block)) % size
+        first = min(len(block), size - start)
+        self.data[start:start + first] = block[:first]
+        self.data[:len(block) - first] = block[first:]
+        with self._cond:
+            self.written += count
+            self._cond.notify_all()
+
+    def wait(self, position, timeout=None):
+        """
+        Block until audio past `position` has been written.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self.written > position, timeout)
+
+    def segments(self, start, end):
+        """
+        Views covering frames [start, end), split in two where the ring wraps.
+        """
+        size = len(self.data)
+        if end - start > size or start < self.written - size:
+            raise ValueError("Requested audio is no longer in the ring")
+        if end <= start:
+            return []
+        first, last = start % size, end % size or size
+        if first < last:
+            return [self.data[first:last]]
+        return [self.data[first:], self.data[:last]]
+
+    def read(self, start, end):
+        return np.concatenate(self.segments(start, end) or [self.data[:0]])
+
+
+class MicStream:
+    """
+    Keeps the input device open and feeds an AudioRing, so a recording can
+    start instantly and include the `pre_roll` seconds before the trigger.
+    """
+
+    def __init__(self, fs=44100, channels=2, seconds=15.0, block_duration=0.02):
+        self.fs = fs
+        self.ring = AudioRing(seconds, fs, channels)
+        # Set on the PortAudio thread, reported by record()
+        self.status = None
+        self.status_count = 0
+        self.stream = sd.InputStream(samplerate=fs, channels=channels, dtype="float32",
+                                     blocksize=int(fs * block_duration), callback=self._callback)
+        self.stream.start()
+
+    def _callback(self, indata, frames, time_info, status):
+        if status:
+            self.status = status
+            self.status_count += 1
+        self.ring.write(indata)
+
+    def noise_floor(self, end, seconds=1.0, percentile=20):
+        """
+        Noise floor in dB from the idle audio in the `seconds` before `end`,
+        or None if the ring doesn't hold that much yet. A low percentile of
+        the block levels, so a word or a click in there doesn't raise it.
+        """
+        start = end - int(seconds * self.fs)
+        if start < max(0, self.ring.written - len(self.ring.data)):
+            return None
+        samples = self.ring.read(start, end)
+        block = int(self.fs * 0.02)
+        levels = [Endpointer.level_db(samples[i:i + block]) for i in range(0, len(samples) - block + 1, block)]
+        return float(np.percentile(levels, percentile))
+
+    def record(self, pre_roll=0.5, on_audio=None, **endpointer_args):
+        """
+        Return everything from `pre_roll` seconds before the call until the
+        endpointer stops, as a (samples, channels) float32 array.
+
+        on_audio, if given, is called with each new stretch of audio (a view
+        into the ring, valid only during the call).
+        """
+        # Never let the recording outgrow the ring.
+        limit = len(self.ring.data) / self.fs - pre_roll - 0.5
+        endpointer_args["max_length"] = min(endpointer_args.get("max_length", 10.0), limit)
+
+        start = position = max(0, self.ring.written - int(pre_roll * self.fs))
+        status_count = self.status_count
+        # Calibrate on the audio before the pre-roll: the pre-roll itself may
+        # already hold the start of the question.
+        if endpointer_args.get("floor_db") is None:
+            endpointer_args["floor_db"] = self.noise_floor(start)
+        endpointer = Endpointer(self.fs, **endpointer_args)
+        done = False
+        while not done:
+            if not self.ring.wait(position, timeout=1.0):
+                log.error("Audio input stalled")
+                break
+            end = self.ring.written
+            for segment in self.ring.segments(position, end):
+                if on_audio is not None:
+                    on_audio(segment)
+                if endpointer.push(segment):
+                    done = True
+                    break
+            position = end
+
+        if self.status_count != status_count:
+            log.warning("Audio input status: %s (%d blocks)", self.status, self.status_count - status_count)
+        log.debug("Recorded %.2f s including %.2f s pre-roll", endpointer.elapsed, pre_roll)
+        return self.ring.read(start, position)
+
+    def close(self):
+        self.stream.stop()
+        self.stream.close()
+
+
+def resample(samples, fs, target_fs):
+    """
+    Band-limited resampling of a 1-D signal by truncating/padding its
+    spectrum, which also acts as the anti-aliasing filter when downsampling.
+    """
+    if fs == target_fs:
+        return samples
+    count = int(round(len(samples) * target_fs / fs))
+    spectrum = np.fft.rfft(samples)
+    return (np.fft.irfft(spectrum, count) * (count / len(samples))).astype(np.float32)
+
+
+class StreamResampler:
+    """
+    Incremental mono resampler for audio arriving in small blocks.
+
+    Uses linear interpolation with the phase carried across blocks, so there
+    are no seams at block boundaries; a two-tap average is applied first to
+    take the edge off aliasing when downsampling.
+    """
+
+    def __init__(self, fs, target_fs):
+        self.step = fs / target_fs
+        self.position = 0.0
+        self.previous = None
+
+    def process(self, block):
+        mono = block.mean(axis=1) if block.ndim > 1 else np.asarray(block, dtype=np.float32)
+        if self.previous is not None:
+            mono = np.concatenate(([self.previous], mono))
+        if len(mono) < 2:
+            return np.zeros(0, dtype=np.float32)
+        smoothed = np.concatenate((mono[:1], (mono[1:] + mono[:-1]) / 2))
+        # Sample times (in input samples) that fall inside this block.
+        times = np.arange(self.position, len(mono) - 1, self.step)
+        out = np.interp(times, np.arange(len(mono)), smoothed).astype(np.float32)
+        self.position = (times[-1] + self.step if len(times) else self.position) - (len(mono) - 1)
+        self.previous = mono[-1]
+        return out
+
+
+# Upload formats: soundfile (format, subtype) and the MIME type sent with it.
+UPLOAD_FORMATS = {
+    "flac": ("FLAC", "PCM_16", "audio/flac"),
+    "opus": ("OGG", "OPUS", "audio/ogg"),
+}
+
+
+def encode_for_upload(recording, fs, target_fs=16000, codec="flac"):
+    """
+    Downmix to mono, resample to `target_fs` and compress in memory.
+    Returns (encoded bytes, filename, mime type).
+    """
+    start = time.perf_counter()
+    mono = recording.mean(axis=1) if recording.ndim > 1 else recording
+    mono = np.clip(resample(mono, fs, target_fs), -1.0, 1.0)
+
+    file_format, subtype, mime = UPLOAD_FORMATS[codec]
+    buffer = io.BytesIO()
+    sf.write(buffer, mono, target_fs, format=file_format, subtype=subtype)
+    data = buffer.getvalue()
+
+    raw_bytes = recording.shape[0] * (recording.shape[1] if recording.ndim > 1 else 1) * 4
+    log.debug("Encoded %.2f s of audio as %s: %d -> %d bytes in %.1f ms",
+              len(mono) / target_fs, codec, raw_bytes, len(data), (time.perf_counter() - start) * 1000)
+    return data, f"audio.{file_format.lower()}", mime
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Fill a throwaway VectorMemory with synthetic scene descriptions and measure
+insert and search latency, plus how often the IVF index returns the same
+best match as an exact scan.
+
+    python bench_memory.py [entries]
+"""
+
+import sys
+import tempfile
+import time
+import numpy as np
+from vector_memory import VectorMemory, embed
+
+OBJECTS = ["bench", "bus stop", "restaurant", "pharmacy", "crosswalk", "fountain", "bicycle", "tree",
+           "mailbox", "cafe", "parking lot", "traffic light", "statue", "playground", "bank", "bookstore"]
+COLOURS = ["red", "green", "blue", "wooden", "metal", "old", "new", "small", "large", "busy"]
+STREETS = ["Main St", "Oak Ave", "Pine Rd", "Elm St", "Market St", "5th Ave", "Lake Dr", "Hill Rd"]
+BATCH = 1000
+
+
+def scene(rng):
+    obj, colour, street = rng.choice(OBJECTS), rng.choice(COLOURS), rng.choice(STREETS)
+    return f"A {colour} {obj} on {street} near number {rng.integers(1, 400)}"
+
+
+def percentile_ms(samples, p):
+    return np.percentile(samples, p) * 1000
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = np.random.default_rng(0)
+    texts = [scene(rng) for _ in range(total)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        memory = VectorMemory(directory)
+
+        began = time.perf_counter()
+        for start in range(0, total - 100, BATCH):
+            memory.add_many("scene", texts[start:min(start + BATCH, total - 100)])
+        bulk = time.perf_counter() - began
+
+        single = []
+        for text in texts[total - 100:]:
+            began = time.perf_counter()
+            memory.add("scene", text)
+            single.append(time.perf_counter() - began)
+
+        queries = [f"where did I last see a {rng.choice(COLOURS)} {rng.choice(OBJECTS)}" for _ in range(200)]
+        latency, agree = [], 0
+        for query in queries:
+            began = time.perf_counter()
+            hits = memory.search(query, k=1, min_score=-1)
+            latency.append(time.perf_counter() - began)
+            exact = int(np.argmax(memory.vectors[:memory.count] @ embed([query])[0]))
+            agree += bool(hits) and hits[0][1]["text"] == memory.entries[exact]["text"]
+
+        print(f"entries:        {memory.count}")
+        print(f"bulk insert:    {bulk:.2f} s ({bulk / (total - 100) * 1e6:.1f} us/entry, batches of {BATCH})")
+        print(f"single insert:  p50 {percentile_ms(single, 50):.2f} ms, p99 {percentile_ms(single, 99):.2f} ms")
+        print(f"search (IVF):   p50 {percentile_ms(latency, 50):.2f} ms, p95 {percentile_ms(latency, 95):.2f} ms, "
+              f"p99 {percentile_ms(latency, 99):.2f} ms")
+        print(f"top-1 recall:   {agree / len(queries):.0%} vs exact scan")
+        memory.close()
+
+
+if __name__ == "__main__":
+    main()
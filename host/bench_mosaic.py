@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Compare the per-frame image list against a single mosaic image.
+
+Both modes give the model every frame at the same resolution (one mosaic
+cell, 512x384, at "high" detail), so the token counts compare like for
+like. Reports payload bytes and estimated vision tokens for both modes, and
+when OPENAI_API_KEY is set also the reasoning() round-trip latency.
+
+    python bench_mosaic.py [frames] [repeats]
+"""
+
+import base64
+import os
+import sys
+import time
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+from image_prep import prepare_images, estimate_tokens, MOSAIC_CELL
+
+
+def make_frames(count, path="test_image.png"):
+    # Simulate a short camera burst: the test image panned a little per frame.
+    image = cv2.imread(path)
+    image = cv2.resize(image, (640, 480), interpolation=cv2.INTER_AREA)
+    now = time.time()
+    frames = []
+    for i in range(count):
+        shift = np.float32([[1, 0, 12 * i], [0, 1, 4 * i]])
+        frame = cv2.warpAffine(image, shift, (640, 480), borderMode=cv2.BORDER_REFLECT)
+        ret, jpeg = cv2.imencode('.jpeg', frame)
+        frames.append({
+            "image": base64.b64encode(jpeg).decode('utf-8'),
+            "timestamp": now - 0.2 * (count - 1 - i),
+        })
+    return frames
+
+
+def per_frame(frames, cell=MOSAIC_CELL, quality=80):
+    # Each frame on its own at the size it gets inside the mosaic
+    prepared = []
+    for item in frames:
+        frame = cv2.imdecode(np.frombuffer(base64.b64decode(item["image"]), np.uint8), cv2.IMREAD_COLOR)
+        frame = cv2.resize(frame, cell, interpolation=cv2.INTER_AREA)
+        ret, jpeg = cv2.imencode('.jpeg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        prepared.append({"image": base64.b64encode(jpeg).decode('utf-8'), "detail": "high"})
+    return prepared
+
+
+def payload_stats(prepared):
+    tokens = 0
+    for item in prepared:
+        frame = cv2.imdecode(np.frombuffer(base64.b64decode(item["image"]), np.uint8), cv2.IMREAD_COLOR)
+        tokens += estimate_tokens(frame.shape[1], frame.shape[0], item["detail"])
+    return sum(len(item["image"]) for item in prepared), tokens
+
+
+def time_reasoning(prepared, query, repeats):
+    from reasoning import reasoning
+
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        reasoning(prepared, query)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    load_dotenv()
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    query = "explain my surroundings"
+    frames = make_frames(count)
+
+    # No byte budget and the same pixels per frame, so only the packing differs.
+    modes = {
+        "per-frame": per_frame(frames),
+        "mosaic": prepare_images(frames, query, max_bytes=None, mosaic=True),
+    }
+
+    print(f"\n{'mode':<10} {'images':>6} {'bytes':>9} {'est. tokens':>11} {'median s':>9}")
+    for name, prepared in modes.items():
+        size, tokens = payload_stats(prepared)
+        latency = "-"
+        if os.getenv("OPENAI_API_KEY"):
+            samples = time_reasoning(prepared, query, repeats)
+            latency = f"{sorted(samples)[len(samples) // 2]:.2f}"
+        print(f"{name:<10} {len(prepared):>6} {size:>9} {tokens:>11} {latency:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Replay the bundled voice samples through the endpointer, in 20 ms blocks as
+the input stream would deliver them, and compare against a fixed 3 second
+recording.
+
+    python bench_vad.py [hangover seconds]
+"""
+
+import os
+import sys
+import wave
+import numpy as np
+from audio import Endpointer
+
+SAMPLES = ["Park.wav", "Resturant.wav"]
+FIXED_DURATION = 3.0
+BLOCK_DURATION = 0.02
+
+
+def load_wav(path):
+    with wave.open(path) as wav:
+        fs = wav.getframerate()
+        data = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+        data = data.reshape(-1, wav.getnchannels()).astype(np.float32) / 32768
+    return data, fs
+
+
+def endpoint_time(data, fs, hangover):
+    # After the clip ends the user is silent, so keep feeding digital silence.
+    padding = np.zeros((int(fs * (hangover + 1.0)), data.shape[1]), dtype=np.float32)
+    stream = np.concatenate([data, padding])
+    endpointer = Endpointer(fs, hangover=hangover)
+    block = int(fs * BLOCK_DURATION)
+    for start in range(0, len(stream), block):
+        if endpointer.push(stream[start:start + block]):
+            break
+    return endpointer.elapsed, endpointer.last_speech
+
+
+def main():
+    hangover = float(sys.argv[1]) if len(sys.argv) > 1 else 0.6
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+    print(f"{'sample':<16} {'clip s':>7} {'speech end s':>12} {'stop s':>7} {'saved s':>8}")
+    for name in SAMPLES:
+        data, fs = load_wav(os.path.join(root, name))
+        stopped, speech_end = endpoint_time(data, fs, hangover)
+        clip = len(data) / fs
+        print(f"{name:<16} {clip:>7.2f} {speech_end or 0:>12.2f} {stopped:>7.2f} {FIXED_DURATION - stopped:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
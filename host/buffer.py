@@ -1,51 +1,273 @@
-import multiprocessing as mp
-from multiprocessing.managers import SyncManager
-from collections import deque
+from multiprocessing import shared_memory
+import os
+import threading
+import time
 import numpy as np
 import cv2
 import base64
+from tracing import traced
 
-# Define a subclass (it can be empty if you don't need extra functionality)
-class SharedDeque(deque):
-    pass
+# Per-slot metadata columns, stored in shared memory next to the frame data.
+SEQ, NBYTES, HEIGHT, WIDTH, CHANNELS, TIMESTAMP, FORMAT = range(7)
+META_FIELDS = 7
 
-# Create a custom manager class.
-class DequeManager(SyncManager):
-    pass
+# Side length of the grayscale thumbnails used to compare frames.
+THUMBNAIL_SIZE = 16
 
-# Register the SharedDeque with the manager,
-# explicitly exposing the methods you need.
-DequeManager.register('deque', SharedDeque, exposed=['append', 'clear', '__len__', '__getitem__'])
+# Slot payload formats: decoded BGR pixels, or the camera's JPEG bytes as sent.
+RAW, JPEG = 0, 1
 
-def create_manager():
-    manager = DequeManager()
-    manager.start()
-    return manager
 
 class Buffer:
-    def __init__(self, capacity, manager):
-        # Create a shared deque with a maximum length.
-        self.queue = manager.deque(maxlen=capacity)
-        # Use a shared lock from the manager.
-        self.lock = manager.Lock()
+    """
+    Fixed-slot ring of frames in shared memory.
+
+    One process (the camera) writes frames in place, any number of processes
+    read them without pickling or a manager process. Every slot carries a
+    sequence number used as a seqlock: it is odd while the slot is being
+    written and advances by 2 on every completed write, so a reader can tell
+    whether the data it looked at was overwritten underneath it.
+    """
+
+    def __init__(self, capacity, frame_shape=(480, 640, 3)):
         self.capacity = capacity
+        self.frame_shape = tuple(frame_shape)
+        self.slot_bytes = int(np.prod(self.frame_shape))
+
+        header_bytes = 8 + capacity * META_FIELDS * 8
+        self.shm = shared_memory.SharedMemory(
+            create=True, size=header_bytes + capacity * self.slot_bytes
+        )
+        # Only the creating process unlinks the segment, forked children just detach.
+        self._owner_pid = os.getpid()
+        self._attach()
+        self._init_cache()
+        self._head[0] = 0
+        self._meta[:] = 0
+
+    def _attach(self):
+        buf = self.shm.buf
+        # Write index: total number of frames ever added.
+        self._head = np.ndarray((1,), dtype=np.int64, buffer=buf, offset=0)
+        self._meta = np.ndarray(
+            (self.capacity, META_FIELDS), dtype=np.int64, buffer=buf, offset=8
+        )
+        self._data = np.ndarray(
+            (self.capacity, self.slot_bytes),
+            dtype=np.uint8,
+            buffer=buf,
+            offset=8 + self.capacity * META_FIELDS * 8,
+        )
+
+    def _init_cache(self):
+        # Process-local base64 JPEG (and decoded pixels for JPEG slots) per
+        # slot, tagged with the slot sequence they were built from so an
+        # overwritten slot never serves a stale image.
+        self._encoded = {}
+        self._decoded = {}
+        self._thumbnails = {}
+        self._encoded_lock = threading.Lock()
+        self._encoder = None
+
+    def __getstate__(self):
+        # Only the segment name crosses the process boundary (spawn start method).
+        return {
+            "name": self.shm.name,
+            "capacity": self.capacity,
+            "frame_shape": self.frame_shape,
+        }
+
+    def __setstate__(self, state):
+        self.capacity = state["capacity"]
+        self.frame_shape = state["frame_shape"]
+        self.slot_bytes = int(np.prod(self.frame_shape))
+        self.shm = shared_memory.SharedMemory(name=state["name"])
+        self._owner_pid = None
+        self._attach()
+        self._init_cache()
+
+    def __len__(self):
+        return min(int(self._head[0]), self.capacity)
 
     def add(self, image: np.ndarray):
-        with self.lock:
-            self.queue.append(image)
+        if image.nbytes > self.slot_bytes:
+            # Oversized frames are scaled down to the slot shape instead of dropped.
+            image = cv2.resize(image, (self.frame_shape[1], self.frame_shape[0]))
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+
+        head = int(self._head[0])
+        slot = head % self.capacity
+        meta = self._meta[slot]
+
+        meta[SEQ] += 1  # odd: write in progress
+        self._data[slot, :image.nbytes] = image.reshape(-1)
+        meta[NBYTES] = image.nbytes
+        meta[HEIGHT] = image.shape[0]
+        meta[WIDTH] = image.shape[1]
+        meta[CHANNELS] = image.shape[2] if image.ndim == 3 else 1
+        meta[TIMESTAMP] = time.time_ns()
+        meta[FORMAT] = RAW
+        meta[SEQ] += 1  # even: slot is consistent again
+        self._head[0] = head + 1
+
+    def add_jpeg(self, data: bytes):
+        """
+        Store an already encoded JPEG as-is. It is only decoded if a consumer
+        asks for pixels, and get_images() hands it out without re-encoding.
+        """
+        if len(data) > self.slot_bytes:
+            raise ValueError(f"JPEG of {len(data)} bytes does not fit a {self.slot_bytes} byte slot")
+
+        head = int(self._head[0])
+        slot = head % self.capacity
+        meta = self._meta[slot]
+
+        meta[SEQ] += 1
+        self._data[slot, :len(data)] = np.frombuffer(data, dtype=np.uint8)
+        meta[NBYTES] = len(data)
+        meta[HEIGHT] = meta[WIDTH] = meta[CHANNELS] = 0
+        meta[TIMESTAMP] = time.time_ns()
+        meta[FORMAT] = JPEG
+        meta[SEQ] += 1
+        self._head[0] = head + 1
+
+    def _view(self, slot):
+        meta = self._meta[slot]
+        if meta[FORMAT] == JPEG:
+            return self._data[slot, :int(meta[NBYTES])]
+        shape = (int(meta[HEIGHT]), int(meta[WIDTH]), int(meta[CHANNELS]))
+        return self._data[slot, :int(meta[NBYTES])].reshape(shape)
+
+    def _read(self, consume):
+        """
+        Run consume(slot, seq) over every buffered frame, oldest first.
+
+        Results whose slot was overwritten while consume ran are discarded.
+        """
+        results = []
+        head = int(self._head[0])
+        for index in range(max(0, head - self.capacity), head):
+            slot = index % self.capacity
+            # Sequence number a slot has right after write number `index` finishes.
+            expected = 2 * (index // self.capacity + 1)
+            if self._meta[slot, SEQ] != expected:
+                continue
+            result = consume(slot, expected)
+            if self._meta[slot, SEQ] != expected:
+                continue
+            results.append(result)
+        return results
 
+    def _pixels(self, slot, seq):
+        if self._meta[slot, FORMAT] == RAW:
+            return self._view(slot)
+
+        with self._encoded_lock:
+            cached = self._decoded.get(slot)
+        if cached is not None and cached[0] == seq:
+            return cached[1]
+        frame = cv2.imdecode(self._view(slot), cv2.IMREAD_COLOR)
+        if frame is not None and self._meta[slot, SEQ] == seq:
+            with self._encoded_lock:
+                self._decoded[slot] = (seq, frame)
+        return frame
+
+    def get_frames(self):
+        """
+        Return the buffered frames as BGR arrays, oldest first.
+
+        Raw slots come back as zero-copy views that alias shared memory and
+        are only valid until the camera wraps around to the same slot; copy
+        them if they need to live longer. JPEG slots are decoded on first use.
+        """
+        return [frame for frame in self._read(self._pixels) if frame is not None]
+
+    def _encode(self, slot, seq):
+        with self._encoded_lock:
+            cached = self._encoded.get(slot)
+        if cached is not None and cached[0] == seq:
+            return cached[1]
+
+        if self._meta[slot, FORMAT] == JPEG:
+            # Already a JPEG straight from the camera, nothing to transcode.
+            buffer_img = self._view(slot)
+        else:
+            # Encode the frame as JPEG outside the lock.
+            ret, buffer_img = cv2.imencode('.jpeg', self._view(slot))
+            if not ret:
+                return None
+        # Convert JPEG bytes to a base64 string.
+        jpg_as_text = base64.b64encode(buffer_img).decode('utf-8')
+
+        # The slot may have been overwritten mid-encode; don't cache that result.
+        if self._meta[slot, SEQ] == seq:
+            with self._encoded_lock:
+                self._encoded[slot] = (seq, jpg_as_text)
+        return jpg_as_text
+
+    @traced("buffer.get_images")
     def get_images(self):
-        converted = []
-        with self.lock:
-            n = len(self.queue)
-            # Access each element by index.
-            frames = [self.queue[i] for i in range(n)]
-            for frame in frames:
-                # Encode the frame as JPEG.
-                ret, buffer_img = cv2.imencode('.jpeg', frame)
-                if not ret:
-                    continue
-                # Convert JPEG bytes to a base64 string.
-                jpg_as_text = base64.b64encode(buffer_img).decode('utf-8')
-                converted.append(jpg_as_text)
-        return converted
\ No newline at end of file
+        return [image for image in self._read(self._encode) if image is not None]
+
+    def _thumbnail(self, slot, seq, size=THUMBNAIL_SIZE):
+        with self._encoded_lock:
+            cached = self._thumbnails.get(slot)
+        if cached is not None and cached[0] == seq:
+            return cached[1]
+
+        if self._meta[slot, FORMAT] == JPEG:
+            # Let libjpeg decode straight to 1/8 scale grayscale, far cheaper than full pixels.
+            gray = cv2.imdecode(self._view(slot), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        else:
+            gray = cv2.cvtColor(self._view(slot), cv2.COLOR_BGR2GRAY)
+        if gray is None:
+            return None
+        thumbnail = cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA)
+
+        if self._meta[slot, SEQ] == seq:
+            with self._encoded_lock:
+                self._thumbnails[slot] = (seq, thumbnail)
+        return thumbnail
+
+    @traced("buffer.get_snapshot")
+    def get_snapshot(self):
+        """
+        Return one consistent read of the buffer, oldest first, as dicts with
+        the base64 JPEG ("image"), a small grayscale "thumbnail" for cheap
+        frame comparisons, and the capture "timestamp" in seconds.
+        """
+        def entry(slot, seq):
+            image = self._encode(slot, seq)
+            thumbnail = self._thumbnail(slot, seq)
+            if image is None or thumbnail is None:
+                return None
+            return {
+                "image": image,
+                "thumbnail": thumbnail,
+                "timestamp": int(self._meta[slot, TIMESTAMP]) / 1e9,
+            }
+
+        return [item for item in self._read(entry) if item is not None]
+
+    def start_encoder(self, interval=0.05):
+        """
+        Keep the JPEG cache warm from a daemon thread in the calling process,
+        so get_images() only has to pick up already encoded frames.
+        """
+        if self._encoder is not None:
+            return
+
+        def run():
+            while True:
+                self._read(self._encode)
+                time.sleep(interval)
+
+        self._encoder = threading.Thread(target=run, name="buffer-encoder", daemon=True)
+        self._encoder.start()
+
+    def close(self):
+        # Drop our own views first, the segment can't be closed while they exist.
+        del self._head, self._meta, self._data
+        self.shm.close()
+        if self._owner_pid == os.getpid():
+            self.shm.unlink()
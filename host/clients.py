@@ -0,0 +1,113 @@
+import os
+import threading
+from collections import defaultdict
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from openai import OpenAI
+from elevenlabs.client import ElevenLabs
+from dotenv import load_dotenv
+
+try:
+    import h2  # noqa: F401  (optional: enables HTTP/2 in httpx)
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+load_dotenv()
+
+# Process-wide clients, created on first use and shared by every query.
+_lock = threading.Lock()
+_session = None
+_adapter = None
+_httpx_client = None
+_openai = None
+_elevenlabs = None
+
+# httpx traffic per host: request count and the distinct connections used.
+_stats_lock = threading.Lock()
+_httpx_requests = defaultdict(int)
+_httpx_connections = defaultdict(set)
+
+
+def get_session():
+    """
+    Shared requests.Session with a keep-alive connection pool per host, so
+    Google Maps and ElevenLabs calls skip the TCP+TLS handshake after the first.
+    """
+    global _session, _adapter
+    with _lock:
+        if _session is None:
+            _adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8)
+            _session = requests.Session()
+            _session.mount("https://", _adapter)
+            _session.mount("http://", _adapter)
+        return _session
+
+
+def _track_httpx(response):
+    host = response.request.url.host
+    stream = response.extensions.get("network_stream")
+    with _stats_lock:
+        _httpx_requests[host] += 1
+        if stream is not None:
+            _httpx_connections[host].add(id(stream))
+
+
+def get_httpx_client():
+    """
+    Shared httpx client for the OpenAI and ElevenLabs SDKs; speaks HTTP/2
+    when the optional h2 package is installed, HTTP/1.1 keep-alive otherwise.
+    """
+    global _httpx_client
+    with _lock:
+        if _httpx_client is None:
+            _httpx_client = httpx.Client(
+                http2=HTTP2,
+                timeout=httpx.Timeout(60.0, connect=10.0),
+                limits=httpx.Limits(max_keepalive_connections=8, keepalive_expiry=120),
+                event_hooks={"response": [_track_httpx]},
+            )
+        return _httpx_client
+
+
+def get_openai():
+    global _openai
+    if _openai is None:
+        client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'), http_client=get_httpx_client())
+        with _lock:
+            _openai = _openai or client
+    return _openai
+
+
+def get_elevenlabs():
+    global _elevenlabs
+    if _elevenlabs is None:
+        client = ElevenLabs(api_key=os.getenv("ELEVEL_LABS_API_KEY"), httpx_client=get_httpx_client())
+        with _lock:
+            _elevenlabs = _elevenlabs or client
+    return _elevenlabs
+
+
+def connection_stats():
+    """
+    Per-host connection reuse: {host: {"requests", "connections", "reused"}}.
+    """
+    stats = {}
+    if _adapter is not None:
+        for key in list(_adapter.poolmanager.pools.keys()):
+            pool = _adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            entry = stats.setdefault(pool.host, {"requests": 0, "connections": 0})
+            entry["requests"] += pool.num_requests
+            entry["connections"] += pool.num_connections
+    with _stats_lock:
+        for host, count in _httpx_requests.items():
+            entry = stats.setdefault(host, {"requests": 0, "connections": 0})
+            entry["requests"] += count
+            entry["connections"] += len(_httpx_connections[host])
+    for entry in stats.values():
+        entry["reused"] = max(0, entry["requests"] - entry["connections"])
+    return stats
+
@@ -0,0 +1,102 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Seconds between checks for cancel() while waiting on running nodes.
+CANCEL_POLL = 0.1
+
+
+class NodeCancelled(Exception):
+    pass
+
+
+class DagExecutor:
+    """
+    Run a dependency graph of calls on a thread pool.
+
+    Each node is {"fn": callable, "deps": set of node ids, "timeout": seconds
+    or None}. fn is called with a dict of its dependencies' outputs as soon as
+    they are all available, so independent nodes run concurrently and the
+    wall-clock time is the critical path rather than the sum of all calls.
+
+    A node that raises or overruns its timeout fails, and everything that
+    depends on it is cancelled instead of run. Threads can't be killed, so a
+    timed-out call is abandoned, not interrupted; long-running functions can
+    poll `cancelled` to stop early.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def run(self, nodes):
+        """
+        Returns (outputs, errors): dicts keyed by node id. Every node ends up
+        in exactly one of them.
+        """
+        for node_id, node in nodes.items():
+            unknown = set(node.get("deps", ())) - set(nodes)
+            if unknown:
+                raise ValueError(f"Node {node_id} depends on unknown nodes {unknown}")
+
+        outputs, errors = {}, {}
+        running = {}  # future -> (node id, deadline)
+        pending = dict(nodes)
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while pending or running:
+                if self.cancelled.is_set():
+                    for node_id in list(pending) + [node_id for node_id, _ in running.values()]:
+                        errors[node_id] = NodeCancelled("Execution cancelled")
+                    for future in running:
+                        future.cancel()
+                    break
+
+                # Skip nodes whose dependencies failed, start the ones that are ready.
+                for node_id, node in list(pending.items()):
+                    deps = set(node.get("deps", ()))
+                    failed = deps & set(errors)
+                    if failed:
+                        errors[node_id] = NodeCancelled(f"Dependency failed: {', '.join(sorted(failed))}")
+                        del pending[node_id]
+                    elif deps <= set(outputs):
+                        inputs = {dep: outputs[dep] for dep in deps}
+                        timeout = node.get("timeout")
+                        deadline = time.monotonic() + timeout if timeout else None
+                        running[pool.submit(node["fn"], inputs)] = (node_id, deadline)
+                        del pending[node_id]
+
+                if not running:
+                    if pending:
+                        # Only reachable with a dependency cycle.
+                        for node_id in pending:
+                            errors[node_id] = ValueError(f"Node {node_id} is part of a dependency cycle")
+                    break
+
+                # Wake up for the nearest deadline, and regularly to notice cancel().
+                deadlines = [d for _, d in running.values() if d is not None]
+                wait_for = CANCEL_POLL
+                if deadlines:
+                    wait_for = min(wait_for, max(0.0, min(deadlines) - time.monotonic()))
+                done, _ = wait(list(running), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    node_id, _ = running.pop(future)
+                    try:
+                        outputs[node_id] = future.result()
+                    except Exception as e:
+                        errors[node_id] = e
+
+                now = time.monotonic()
+                for future, (node_id, deadline) in list(running.items()):
+                    if deadline is not None and now >= deadline:
+                        future.cancel()
+                        del running[future]
+                        errors[node_id] = TimeoutError(f"Node {node_id} timed out")
+        finally:
+            # Don't wait on abandoned (timed out or cancelled) calls.
+            pool.shutdown(wait=False, cancel_futures=True)
+        return outputs, errors
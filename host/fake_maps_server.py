@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Google Maps endpoints Action calls: geolocation,
+Places nearby search and Directions. Answers are canned and every request
+is counted per endpoint, so cache hits show up as requests not made.
+
+    python fake_maps_server.py [port]
+    MAPS_API_URL=http://127.0.0.1:8766 python main.py
+"""
+
+import json
+import sys
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+LOCATION = {"lat": 37.4275, "lng": -122.1697}
+
+PLACES = {
+    "status": "OK",
+    "results": [
+        {"name": "Oak Park", "vicinity": "12 Main St", "geometry": {"location": {"lat": 37.4290, "lng": -122.1680}}},
+        {"name": "Elm Park", "vicinity": "40 Side Ave", "geometry": {"location": {"lat": 37.4310, "lng": -122.1650}}},
+    ],
+}
+
+ROUTE = {
+    "status": "OK",
+    "routes": [{"legs": [{"steps": [
+        {"html_instructions": "Head <b>north</b> on Main St", "duration": {"value": 60},
+         "distance": {"value": 80}, "end_location": {"lat": 37.4282, "lng": -122.1697}},
+        {"html_instructions": "Turn <b>right</b> onto Oak Ave", "duration": {"value": 90},
+         "distance": {"value": 120}, "end_location": {"lat": 37.4290, "lng": -122.1680}},
+    ]}]}],
+}
+
+
+def make_handler(counts):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, body):
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            path = urlsplit(self.path).path
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if path != "/geolocation/v1/geolocate":
+                self.send_error(404)
+                return
+            counts[path] += 1
+            self._reply({"location": LOCATION, "accuracy": 20})
+
+        def do_GET(self):
+            path = urlsplit(self.path).path
+            if path == "/maps/api/place/nearbysearch/json":
+                body = PLACES
+            elif path == "/maps/api/directions/json":
+                body = ROUTE
+            else:
+                self.send_error(404)
+                return
+            counts[path] += 1
+            self._reply(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(port=8766, host="127.0.0.1"):
+    """
+    Start the server on a daemon thread and return it (port 0 picks a free
+    one). server.counts holds the number of requests per endpoint.
+    """
+    counts = Counter()
+    server = ThreadingHTTPServer((host, port), make_handler(counts))
+    server.counts = counts
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8766
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(Counter()))
+    print(f"Fake Google Maps listening on http://127.0.0.1:{port}")
+    server.serve_forever()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for ElevenLabs realtime speech-to-text, as used by
+transcription.StreamingTranscriber.
+
+It speaks the same WebSocket protocol: "session_started" on connect, a
+"partial_transcript" for every `partial_every` seconds of audio received in
+"input_audio_chunk" messages, and a "committed_transcript" once a chunk
+arrives with "commit": true. It can't recognise speech, so the committed
+text is whatever it was started with.
+
+    python fake_stt_server.py [port] [final text]
+    STREAMING_STT_URL=ws://127.0.0.1:8765/v1/speech-to-text/realtime python main.py
+"""
+
+import base64
+import json
+import sys
+import threading
+from websockets.sync.server import serve as serve_websocket
+
+
+def make_handler(final_text, partial_every=0.5):
+    def handler(websocket):
+        websocket.send(json.dumps({"message_type": "session_started", "session_id": "fake"}))
+        received = 0
+        next_partial = partial_every
+        for raw in websocket:
+            message = json.loads(raw)
+            if message.get("message_type") != "input_audio_chunk":
+                websocket.send(json.dumps({"message_type": "input_error",
+                                           "error": f"Unexpected message {message.get('message_type')}"}))
+                continue
+            received += len(base64.b64decode(message.get("audio_base_64", "")))
+            seconds = received / 2 / message.get("sample_rate", 16000)
+            if seconds >= next_partial:
+                websocket.send(json.dumps({"message_type": "partial_transcript", "text": f"[{seconds:.1f} s heard]"}))
+                next_partial += partial_every
+            if message.get("commit"):
+                websocket.send(json.dumps({"message_type": "committed_transcript", "text": final_text}))
+                received, next_partial = 0, partial_every
+
+    return handler
+
+
+def serve(port=8765, final_text="give me directions to the nearest park", host="127.0.0.1"):
+    """
+    Start the server on a daemon thread and return it (port 0 picks a free one).
+    """
+    server = serve_websocket(make_handler(final_text), host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    text = sys.argv[2] if len(sys.argv) > 2 else "give me directions to the nearest park"
+    server = serve_websocket(make_handler(text), "127.0.0.1", port)
+    print(f"Fake streaming STT listening on ws://127.0.0.1:{port}/v1/speech-to-text/realtime")
+    server.serve_forever()
@@ -0,0 +1,194 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from navigation import distance_m
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Geohash precision 7 cells are ~150 m across, 8 are ~38 m
+PLACES_PRECISION = 7
+ROUTE_PRECISION = 8
+PLACES_TTL = 24 * 3600
+ROUTE_TTL = 6 * 3600
+
+
+def geohash(lat, lng, precision=7):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    bits, code, even = 0, [], True
+    value = 0
+    while len(code) < precision:
+        rng, coord = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            code.append(BASE32[value])
+            bits, value = 0, 0
+    return "".join(code)
+
+
+def _point(location):
+    """
+    (lat, lng) from a "lat,lng" string or a tuple; None for an address.
+    """
+    if isinstance(location, (tuple, list)):
+        return float(location[0]), float(location[1])
+    parts = str(location).split(",")
+    if len(parts) == 2:
+        try:
+            return float(parts[0]), float(parts[1])
+        except ValueError:
+            pass
+    return None
+
+
+def _snap(location, precision):
+    point = _point(location)
+    if point is None:
+        return " ".join(str(location).lower().split())
+    return geohash(point[0], point[1], precision)
+
+
+def places_key(location, place_type, radius):
+    return f"places:{_snap(location, PLACES_PRECISION)}:{place_type}:{int(radius)}"
+
+
+def route_key(origin, destination, mode):
+    return f"route:{_snap(origin, ROUTE_PRECISION)}:{_snap(destination, ROUTE_PRECISION)}:{mode}"
+
+
+class MapsCache:
+    """
+    Cache for Google Maps responses: an LRU dict in memory over a SQLite
+    table on disk, so places and routes survive restarts.
+
+    Nearby-search results are keyed by geohash cell + type + radius and
+    routes by snapped origin + destination, so small GPS jitter still hits.
+    The current location is memory-only with a movement-aware TTL: the
+    faster the user has been moving, the sooner it expires.
+    """
+
+    def __init__(self, path=".maps_cache.sqlite", max_items=256, max_disk_items=5000,
+                 min_location_ttl=5, max_location_ttl=60, move_distance=25):
+        self.max_items = max_items
+        self.max_disk_items = max_disk_items
+        self.min_location_ttl = min_location_ttl
+        self.max_location_ttl = max_location_ttl
+        self.move_distance = move_distance
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._fixes = []
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS entries "
+                             "(key TEXT PRIMARY KEY, value TEXT, expires REAL, used REAL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+            self._db.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[1] > now:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._memory[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT value, expires FROM entries WHERE key = ? AND expires > ?",
+                                       (key, now)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE entries SET used = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now + ttl)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                                 (key, json.dumps(value), now + ttl, now))
+                # Least recently used rows go first once the table is full
+                self._db.execute("DELETE FROM entries WHERE key IN (SELECT key FROM entries "
+                                 "ORDER BY used DESC LIMIT -1 OFFSET ?)", (self.max_disk_items,))
+                self._db.commit()
+
+    def _remember(self, key, value, expires):
+        self._memory[key] = (value, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def location_ttl(self):
+        """
+        Seconds until the user has probably moved `move_distance` metres,
+        estimated from the last two fixes.
+        """
+        if len(self._fixes) < 2:
+            return self.min_location_ttl
+        (t0, a), (t1, b) = self._fixes[-2:]
+        speed = distance_m(a, b) / max(t1 - t0, 1e-3)
+        if speed <= 0:
+            return self.max_location_ttl
+        return min(self.max_location_ttl, max(self.min_location_ttl, self.move_distance / speed))
+
+    def current_location(self):
+        with self._lock:
+            if self._fixes and time.time() - self._fixes[-1][0] < self.location_ttl():
+                self.hits += 1
+                return dict(self._fixes[-1][1])
+            self.misses += 1
+            return None
+
+    def last_location(self):
+        # Most recent fix however old, for tagging memories; None before the first lookup
+        with self._lock:
+            return dict(self._fixes[-1][1]) if self._fixes else None
+
+    def remember_location(self, location):
+        if not location:
+            return
+        with self._lock:
+            self._fixes = self._fixes[-1:] + [(time.time(), dict(location))]
+
+    def stats(self):
+        with self._lock:
+            return {"memory_hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "memory_items": len(self._memory)}
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_maps_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MapsCache(os.getenv("MAPS_CACHE_PATH", ".maps_cache.sqlite"))
+        return _cache
@@ -0,0 +1,189 @@
+import base64
+import logging
+import math
+import re
+import cv2
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# Quality ladders, best first: (longest side in px, JPEG quality, detail).
+# Reading text needs resolution and "high" detail; describing a scene doesn't,
+# so scene frames always go out at "low" detail (a flat 85 tokens each).
+PROFILES = {
+    "text": [
+        (2048, 90, "high"),
+        (1536, 85, "high"),
+        (1024, 80, "high"),
+        (768, 75, "high"),
+        (512, 70, "low"),
+    ],
+    "scene": [
+        (768, 70, "low"),
+        (512, 65, "low"),
+        (384, 55, "low"),
+    ],
+}
+
+# Mosaic cell (width, height): 4:3 frames, two cells across fill one 1024px row of tiles.
+MOSAIC_CELL = (512, 384)
+
+TEXT_KEYWORDS = ["read", "text", "sign", "say", "written", "menu", "label", "word", "letter", "number"]
+# Keywords must start a word: "sign" but not "design", "read" but not "already"
+TEXT_QUERY = re.compile(r"\b(?:" + "|".join(TEXT_KEYWORDS) + ")")
+
+
+def query_profile(query):
+    return "text" if TEXT_QUERY.search((query or "").lower()) else "scene"
+
+
+def estimate_tokens(width, height, detail):
+    """
+    Estimated vision tokens for one image (OpenAI tiling rules): a flat 85 for
+    "low", otherwise 85 + 170 per 512px tile after fitting 2048 and 768.
+    """
+    if detail == "low":
+        return 85
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def _render(frame, max_side, quality):
+    height, width = frame.shape[:2]
+    scale = max_side / max(height, width)
+    if scale < 1.0:
+        frame = cv2.resize(frame, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    ret, jpeg = cv2.imencode('.jpeg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ret:
+        return None
+    return base64.b64encode(jpeg).decode('utf-8'), frame.shape[1], frame.shape[0]
+
+
+def _decode(image):
+    original = image["image"] if isinstance(image, dict) else image
+    return cv2.imdecode(np.frombuffer(base64.b64decode(original), np.uint8), cv2.IMREAD_COLOR)
+
+
+def mosaic_layout(count, cell=MOSAIC_CELL):
+    """
+    Pick the (columns, rows) grid for `count` frames whose canvas costs the
+    fewest vision tokens, preferring fewer empty cells on ties. Grids the
+    model would downscale (past 2048px, or shortest side past 768px) come
+    last, since every frame would then arrive smaller than its cell.
+    """
+    best = None
+    for columns in range(1, count + 1):
+        rows = math.ceil(count / columns)
+        width, height = columns * cell[0], rows * cell[1]
+        downscaled = max(width, height) > 2048 or min(width, height) > 768
+        key = (downscaled, estimate_tokens(width, height, "high"), columns * rows - count)
+        if best is None or key < best[0]:
+            best = (key, columns, rows)
+    return best[1], best[2]
+
+
+def build_mosaic(images, cell=MOSAIC_CELL, quality=80):
+    """
+    Tile several frames into one base64 JPEG grid so a request carries a
+    single image. Cells are sized so the canvas lands on the model's 512px
+    tile boundaries; snapshot entries get their age stamped in the corner.
+    """
+    frames = [_decode(image) for image in images]
+    kept = [(image, frame) for image, frame in zip(images, frames) if frame is not None]
+    if not kept:
+        return None
+
+    timestamps = [image.get("timestamp") for image, _ in kept if isinstance(image, dict)]
+    newest = max((t for t in timestamps if t is not None), default=None)
+
+    columns, rows = mosaic_layout(len(kept), cell)
+    canvas = np.zeros((rows * cell[1], columns * cell[0], 3), dtype=np.uint8)
+    for index, (image, frame) in enumerate(kept):
+        row, column = divmod(index, columns)
+        tile = cv2.resize(frame, cell, interpolation=cv2.INTER_AREA)
+        timestamp = image.get("timestamp") if isinstance(image, dict) else None
+        label = f"#{index + 1}"
+        if timestamp is not None and newest is not None:
+            label += f" t-{newest - timestamp:.1f}s"
+        cv2.putText(tile, label, (8, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 4)
+        cv2.putText(tile, label, (8, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        canvas[row * cell[1]:(row + 1) * cell[1], column * cell[0]:(column + 1) * cell[0]] = tile
+
+    ret, jpeg = cv2.imencode('.jpeg', canvas, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ret:
+        return None
+    return base64.b64encode(jpeg).decode('utf-8')
+
+
+def prepare_images(images, query, max_bytes=300_000, max_tokens=None, mosaic=False):
+    """
+    Re-encode base64 JPEG frames so the whole request fits a byte and/or
+    vision-token budget.
+
+    With mosaic=True several frames are packed into one grid image sent at
+    "high" detail and its tile-aligned size, lowering only the JPEG quality
+    to meet max_bytes; if the grid alone exceeds max_tokens the frames go
+    separately. Otherwise each frame gets an equal share of the budget and
+    is rendered at the best level of the query's profile that fits it.
+    Returns a list of {"image": base64, "detail": "low"|"high"} dicts for
+    reasoning().
+    """
+    if not images:
+        return []
+
+    if mosaic and len(images) > 1:
+        columns, rows = mosaic_layout(len(images))
+        tokens = estimate_tokens(columns * MOSAIC_CELL[0], rows * MOSAIC_CELL[1], "high")
+        if max_tokens is None or tokens <= max_tokens:
+            # Not through the profile ladder: a scene ladder would shrink the grid and
+            # send it at "low", leaving each frame a fraction of its cell's resolution
+            for quality in (80, 70, 60, 50):
+                packed = build_mosaic(images, quality=quality)
+                if packed is None or max_bytes is None or len(packed) <= max_bytes:
+                    break
+            if packed is not None:
+                before = sum(len(i["image"] if isinstance(i, dict) else i) for i in images)
+                log.debug("Packed %d frames into one %dx%d mosaic (~%d tokens): %d -> %d bytes",
+                          len(images), columns, rows, tokens, before, len(packed))
+                return [{"image": packed, "detail": "high"}]
+
+    ladder = PROFILES[query_profile(query)]
+    byte_share = max_bytes / len(images) if max_bytes else None
+    token_share = max_tokens / len(images) if max_tokens else None
+
+    prepared = []
+    for image in images:
+        original = image["image"] if isinstance(image, dict) else image
+        frame = _decode(image)
+        if frame is None:
+            continue
+
+        choice = None
+        for max_side, quality, detail in ladder:
+            height, width = frame.shape[:2]
+            fits_tokens = token_share is None or estimate_tokens(width, height, detail) <= token_share
+            if max(height, width) <= max_side and fits_tokens and (byte_share is None or len(original) <= byte_share):
+                # Already small enough: send the original bytes, no generation loss.
+                choice = {"image": original, "detail": detail}
+                break
+
+            rendered = _render(frame, max_side, quality)
+            if rendered is None:
+                continue
+            encoded, width, height = rendered
+            choice = {"image": encoded, "detail": detail}
+            fits_bytes = byte_share is None or len(encoded) <= byte_share
+            fits_tokens = token_share is None or estimate_tokens(width, height, detail) <= token_share
+            if fits_bytes and fits_tokens:
+                break
+        # Nothing fit: fall back to the cheapest level rather than dropping the frame.
+        if choice is not None:
+            prepared.append(choice)
+
+    before = sum(len(i["image"] if isinstance(i, dict) else i) for i in images)
+    after = sum(len(p["image"]) for p in prepared)
+    log.debug("Prepared %d images for a %s query: %d -> %d bytes", len(prepared), query_profile(query), before, after)
+    return prepared
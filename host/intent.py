@@ -0,0 +1,182 @@
+import logging
+import math
+import re
+from collections import Counter, defaultdict
+
+log = logging.getLogger(__name__)
+
+# Keyword tables. Place types are listed in priority order: the first type
+# with a match wins, as in the old if/elif chain.
+IMAGE_KEYWORDS = [
+    "analyz", "describ", "explain", "tell me about", "what is", "what's in",
+    "show me", "identify", "recognize", "interpret", "read", "tell me what",
+    "scan", "look at", "examine", "codesignal", "surrounding",
+    "what's around", "what is around", "in front of me", "what do you see", "what can you see",
+]
+
+PLACE_KEYWORDS = [
+    ("restaurant", ["restaurant", "food", "eat", "dining"]),
+    ("gas_station", ["gas", "fuel"]),
+    ("hospital", ["hospital", "doctor", "medical", "emergency"]),
+    ("store", ["store", "shop", "mall"]),
+    ("park", ["park", "playground", "garden"]),
+    ("lodging", ["hotel", "motel", "place to stay", "lodging"]),
+    ("cafe", ["coffee", "cafe"]),
+    ("school", ["school", "college", "university"]),
+    ("bank", ["bank", "atm"]),
+    ("pharmacy", ["pharmacy", "drugstore"]),
+]
+
+NEAREST_KEYWORDS = ["nearest", "closest", "nearby", "near me", "near here", "around here", "around me",
+                    "find a", "find the", "where is the", "where's the", "is there a"]
+
+# Questions about the past are answered from the local memory. Every phrase is
+# anchored in the past, so "remind me to ..." or "read the sign" stay out.
+MEMORY_KEYWORDS = ["last see", "last saw", "did i see", "did we see", "have i seen", "have we seen",
+                   "did i pass", "did we pass", "we passed", "i passed", "we saw", "i saw", "where was the",
+                   "remember seeing", "remember passing", "remember where"]
+
+DIRECTIONS_KEYWORDS = ["direction", "route", "take me", "navigate", "guide me", "how do i get",
+                       "walk me", "get me to", "way to", "lead me"]
+
+
+def _compile():
+    """
+    One alternation over every table, so a query is scanned once. Each
+    keyword gets a named group that maps back to (kind, value). Keywords
+    must start at a word boundary ("eat" no longer matches "great") and
+    longer keywords are tried first.
+    """
+    entries = [("image", None, k) for k in IMAGE_KEYWORDS]
+    entries += [("place", place, k) for place, keywords in PLACE_KEYWORDS for k in keywords]
+    entries += [("nearest", None, k) for k in NEAREST_KEYWORDS]
+    entries += [("directions", None, k) for k in DIRECTIONS_KEYWORDS]
+    entries += [("memory", None, k) for k in MEMORY_KEYWORDS]
+    entries.sort(key=lambda e: -len(e[2]))
+    groups = {}
+    parts = []
+    for i, (kind, value, keyword) in enumerate(entries):
+        groups[f"k{i}"] = (kind, value)
+        parts.append(f"(?P<k{i}>{re.escape(keyword)})")
+    return re.compile(r"\b(?:" + "|".join(parts) + ")"), groups
+
+
+MATCHER, GROUPS = _compile()
+PLACE_ORDER = {place: i for i, (place, _) in enumerate(PLACE_KEYWORDS)}
+
+
+def scan(query):
+    """
+    {"image", "nearest", "directions", "memory": bool, "place_type": str or None}
+    """
+    hits = defaultdict(set)
+    for match in MATCHER.finditer(query.lower()):
+        kind, value = GROUPS[match.lastgroup]
+        hits[kind].add(value)
+    places = sorted(hits["place"], key=PLACE_ORDER.get)
+    return {
+        "image": "image" in hits,
+        "nearest": "nearest" in hits,
+        "directions": "directions" in hits,
+        "memory": "memory" in hits,
+        "place_type": places[0] if places else None,
+    }
+
+
+# A few labelled queries for the fallback classifier
+EXAMPLES = [
+    ("nearest", "where can i get something to eat"),
+    ("nearest", "i need a pharmacy"),
+    ("nearest", "any coffee shops close by"),
+    ("nearest", "is a hospital close"),
+    ("nearest", "which bank is closest to me"),
+    ("directions", "how can i walk to the park"),
+    ("directions", "bring me to a hotel"),
+    ("directions", "i want to go to the hospital"),
+    ("directions", "lead the way to a cafe"),
+    ("directions", "help me get to a store"),
+    ("other", "what does this sign say"),
+    ("other", "is the park open today"),
+    ("other", "what color is the car in front of me"),
+    ("other", "is it safe to cross"),
+    ("other", "how many people are in this restaurant"),
+]
+
+TOKEN = re.compile(r"[a-z']+")
+
+
+class IntentClassifier:
+    """
+    Small multinomial naive Bayes over word counts, for queries that name a
+    place but match neither keyword table. Only answers when confident.
+    """
+
+    def __init__(self, examples=EXAMPLES, threshold=0.7):
+        self.threshold = threshold
+        self.words = defaultdict(Counter)
+        self.docs = Counter()
+        for label, text in examples:
+            self.docs[label] += 1
+            self.words[label].update(TOKEN.findall(text))
+        self.vocab = {w for counts in self.words.values() for w in counts}
+        self.totals = {label: sum(counts.values()) for label, counts in self.words.items()}
+
+    def predict(self, query):
+        tokens = TOKEN.findall(query.lower())
+        scores = {}
+        for label in self.docs:
+            score = math.log(self.docs[label] / sum(self.docs.values()))
+            for token in tokens:
+                score += math.log((self.words[label][token] + 1) / (self.totals[label] + len(self.vocab)))
+            scores[label] = score
+        best = max(scores.values())
+        norm = sum(math.exp(s - best) for s in scores.values())
+        label = max(scores, key=scores.get)
+        confidence = 1 / norm
+        return (label, confidence) if confidence >= self.threshold else (None, confidence)
+
+
+_classifier = IntentClassifier()
+
+
+def route(query, classifier=_classifier):
+    """
+    Classify a query locally. Returns {"intent", "place_type"} where intent
+    is "memory", "directions", "nearest", "image_analysis" or None (ask the
+    model). Questions about the past come first; naming a place together
+    with a navigation phrase beats an image keyword, so "what is the
+    nearest pharmacy" is a place lookup.
+    """
+    found = scan(query)
+    place = found["place_type"]
+    if found["memory"]:
+        return {"intent": "memory", "place_type": place}
+    if place and found["directions"]:
+        return {"intent": "directions", "place_type": place}
+    if place and found["nearest"]:
+        return {"intent": "nearest", "place_type": place}
+    if found["image"]:
+        return {"intent": "image_analysis", "place_type": place}
+    if place and classifier is not None:
+        label, confidence = classifier.predict(query)
+        if label in ("nearest", "directions"):
+            log.debug("Intent classifier: %s (%.2f)", label, confidence)
+            return {"intent": label, "place_type": place}
+    return {"intent": None, "place_type": place}
+
+
+def template_plan(intent):
+    """
+    The fixed action plan for a routed navigation intent, in make_plan's
+    format, or None when the model has to plan.
+    """
+    if intent["intent"] not in ("nearest", "directions"):
+        return None
+    steps = [
+        {"id": "loc", "call": "get_current_location", "args": {}},
+        {"id": "place", "call": "get_nearby_places", "args": {"location": "$loc", "type": intent["place_type"]}},
+    ]
+    if intent["intent"] == "directions":
+        steps.append({"id": "route", "call": "get_route_to_destination",
+                      "args": {"origin": "$loc", "destination": "$place"}})
+    return {"steps": steps, "answer": None}
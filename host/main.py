@@ -1,33 +1,55 @@
-from buffer import Buffer, create_manager
+from buffer import Buffer
+from mjpeg import read_mjpeg
+from selection import select_frames
+from image_prep import prepare_images
+from trigger import TriggerHub, FileTrigger, SocketTrigger, HttpTrigger
+from clients import connection_stats
+from playback import get_engine
+from action import get_phrase_cache
+from geo_cache import get_maps_cache
+from speculation import get_speculator
+from tracing import get_tracer, span, configure_logging
 import multiprocessing as mp
+import logging
 import cv2
 import time
 import numpy as np
-from test_chain import test_chain
-from transcription import transcribe_with_elevenlabs
+from test_chain import test_chain, shared_actions
+from transcription import transcribe_recording, StreamingTranscriber
 import os
 import time
 import sounddevice as sd
-import soundfile as sf
+from audio import record_until_silence, MicStream
 
-def record_audio(filename, duration=3, fs=44100):
-    print("Recording for", duration, "seconds...")
+log = logging.getLogger(__name__)
+
+def capture_audio(duration=3, fs=44100, endpoint=True, max_length=10, mic=None, on_audio=None):
     sd.default.device = (0, None)
+    if mic is not None:
+        # Already-open stream: no device open latency, and keeps speech from just before the trigger
+        return mic.record(max_length=max_length, on_audio=on_audio), mic.fs
+    if endpoint:
+        # Stop as soon as the user stops talking instead of after a fixed duration
+        log.debug("Recording until silence...")
+        return record_until_silence(fs=fs, channels=2, max_length=max_length, on_audio=on_audio), fs
+    log.debug("Recording for %s seconds...", duration)
     recording = sd.rec(int(duration * fs), samplerate=fs, channels=2)
     sd.wait()
-    try:
-        os.remove(filename)  # Remove the file if it exists
-    except FileNotFoundError:
-        pass
-    # Save the recording as a WAV file
-    sf.write(filename, recording, fs)
+    return recording, fs
+
+CAMERA_URL = 'http://172.20.10.3:81/stream'  # Adjust URL to your MJPEG endpoint
+
+def camera_process(buffer, mode="mjpeg"):
+    configure_logging()
+    log.info("Camera process started")
+    if mode == "mjpeg":
+        mjpeg_camera(buffer)
+        return
 
-def camera_process(buffer):
-    print("Camera process started")
-    cap = cv2.VideoCapture('http://172.20.10.3:81/stream')  # Adjust URL to your MJPEG endpoint
+    cap = cv2.VideoCapture(CAMERA_URL)
 
     if not cap.isOpened():
-        print("Error: Unable to open MJPEG stream.")
+        log.error("Unable to open MJPEG stream.")
         return
 
     while True:
@@ -39,29 +61,91 @@ def camera_process(buffer):
         # Add the new frame to the buffer
         buffer.add(frame)
 
-def agent_process(buffer):
-    print("Agent process started")
-    # Polling algorithm to check for file named "mic.txt" acts as button
+def mjpeg_camera(buffer):
+    # Store the camera's JPEG parts as-is: no decode here and no re-encode in get_images
     while True:
-        if os.path.exists("mic.txt"):
-            print(f"Mic input detected, Starting Agent Process")
-            # Remove the file to avoid re-triggering
-            os.remove("mic.txt")
-            # Retrieve the base64-encoded images from the buffer
-            images = buffer.get_images()
-            record_audio("output.wav")
-            query = [transcribe_with_elevenlabs("output.wav")]
-        
-            #print(f"Agent sees {images} frames in the buffer.")
-            # print(f"Agent sees {images} frames in the buffer.")
+        try:
+            for jpeg in read_mjpeg(CAMERA_URL):
+                try:
+                    buffer.add_jpeg(jpeg)
+                except ValueError as e:
+                    log.debug("Skipping frame: %s", e)
+        except Exception as e:
+            log.error("MJPEG stream failed (%s), reconnecting...", e)
+            time.sleep(1)
+
+def agent_process(buffer, mosaic=False):
+    configure_logging()
+    log.info("Agent process started")
+    # Encode new frames in the background so a query only picks up cached JPEGs
+    buffer.start_encoder()
+    # The "mic.txt" file, a Unix socket and an HTTP endpoint all act as the button
+    # A new press cuts off whatever is still being spoken (barge-in)
+    speaker = get_engine()
+    triggers = TriggerHub(on_fire=lambda source: speaker.stop())
+    triggers.add(FileTrigger("mic.txt"))
+    triggers.add(SocketTrigger())
+    triggers.add(HttpTrigger())
+    # Keep the microphone open so recording starts instantly, with pre-roll
+    sd.default.device = (0, None)
+    mic = MicStream()
+    tracer = get_tracer()
+    while True:
+        source = triggers.wait()
+        tracer.start_trace()
+        tracer.record("trigger", triggers.dispatch_latency, source=source)
+        log.info("Mic input detected (%s), starting query", source)
+        with span("query"):
+            # Speculatively fetch the location and pick frames while the user is still speaking
+            speculator = get_speculator()
+            speculator.start("location", shared_actions().locate)
+            speculator.start("frames", select_frames, buffer)
+            # With streaming STT on, transcribe while the user is still talking
+            transcriber = None
+            if os.getenv("STREAMING_STT") == "1" or os.getenv("STREAMING_STT_URL"):
+                try:
+                    transcriber = StreamingTranscriber(fs=mic.fs).start()
+                except OSError as e:
+                    log.error("Could not reach streaming STT (%s), using batch transcription", e)
+            # Anything still playing (e.g. a route instruction) drops in volume while the user talks
+            speaker.duck()
+            try:
+                with span("record"):
+                    recording, fs = capture_audio(mic=mic, on_audio=transcriber.send if transcriber else None)
+            finally:
+                speaker.unduck()
+            with span("stt", streaming=transcriber is not None):
+                text = transcriber.finish() if transcriber else None
+                if text is None:
+                    # Recorded audio goes to transcription in memory, compressed, never via output.wav
+                    text = transcribe_recording(recording, fs)
+            query = [text]
+            log.info("Query: %s", text)
+            # Retrieve the distinct base64-encoded images from the buffer
+            with span("frames"):
+                images = speculator.take("frames")
+                if images is None:
+                    images = select_frames(buffer)
+            # Fit the frames to the upload budget for this kind of query
+            with span("encode", frames=len(images)):
+                images = prepare_images(images, query[0], mosaic=mosaic)
+
             test_chain(images, query )
-        # change polling rate right now is polling once every second
-        time.sleep(1)
+        # A location nobody asked for (e.g. an image question) is thrown away
+        speculator.finish()
+        tracer.log_summary()
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Connection reuse: %s", connection_stats())
+            log.debug("Playback: %s", speaker.stats())
+            log.debug("TTS cache: %s", get_phrase_cache().stats())
+            log.debug("Maps cache: %s", get_maps_cache().stats())
+            log.debug("Speculation: %s", speculator.stats())
+            # Presses while a query runs collapse into at most one pending trigger
+            log.debug("Coalesced trigger presses: %d", triggers.coalesced)
 
 def main():
-    manager = create_manager()
-    # Create a Buffer that holds a maximum of 5 frames.
-    buffer = Buffer(capacity=5, manager=manager)
+    # Create a shared-memory Buffer that holds a maximum of 5 frames.
+    buffer = Buffer(capacity=5)
 
     # Pass the same buffer instance to both processes.
     camera = mp.Process(target=camera_process, args=(buffer,))
@@ -79,6 +163,8 @@ def main():
         agent.terminate()
         camera.join()
         agent.join()
+    finally:
+        buffer.close()
 
 if __name__ == "__main__":
     main()
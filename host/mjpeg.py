@@ -0,0 +1,66 @@
+import re
+import requests
+
+
+def _boundary(content_type):
+    match = re.search(r'boundary="?([^";]+)"?', content_type or "")
+    if not match:
+        raise ValueError(f"Not a multipart stream: {content_type}")
+    boundary = match.group(1)
+    # Some servers already prefix the boundary with dashes in the header.
+    if boundary.startswith("--"):
+        boundary = boundary[2:]
+    return b"--" + boundary.encode()
+
+
+def iter_parts(chunks, boundary):
+    """
+    Split a multipart/x-mixed-replace byte stream into raw part bodies.
+
+    Uses the part's Content-Length when present (the ESP32 firmware always
+    sends it) and falls back to scanning for the next boundary otherwise.
+    """
+    data = bytearray()
+    for chunk in chunks:
+        data += chunk
+        while True:
+            start = data.find(boundary)
+            if start < 0:
+                # Keep only a tail that could still hold a split boundary.
+                del data[:max(0, len(data) - len(boundary))]
+                break
+            header_end = data.find(b"\r\n\r\n", start)
+            if header_end < 0:
+                break
+            headers = bytes(data[start + len(boundary):header_end])
+            body_start = header_end + 4
+
+            length = re.search(rb"content-length:\s*(\d+)", headers, re.IGNORECASE)
+            if length:
+                body_end = body_start + int(length.group(1))
+                if len(data) < body_end:
+                    break
+            else:
+                body_end = data.find(boundary, body_start)
+                if body_end < 0:
+                    break
+                # Strip the CRLF that precedes the next boundary.
+                while body_end > body_start and data[body_end - 1] in b"\r\n":
+                    body_end -= 1
+
+            yield bytes(data[body_start:body_end])
+            del data[:body_end]
+
+
+def read_mjpeg(url, chunk_size=16384, timeout=10):
+    """
+    Yield the JPEG bytes of every frame of an MJPEG stream, without decoding.
+    """
+    with requests.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        boundary = _boundary(response.headers.get("Content-Type"))
+        chunks = response.iter_content(chunk_size=chunk_size)
+        for part in iter_parts(chunks, boundary):
+            # Only keep complete JPEGs (SOI ... EOI).
+            if part.startswith(b"\xff\xd8"):
+                yield part
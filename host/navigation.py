@@ -0,0 +1,206 @@
+import heapq
+import itertools
+import logging
+import math
+import re
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Spoken navigation controls, checked before a query goes to the model while a
+# route is active. Each pattern must match the whole (normalised) utterance,
+# so "how far is the nearest pharmacy" or "what was the last restaurant we
+# passed" still reach the intent router.
+ROUTE = r"(the |my |this )?(navigation|directions|route|guidance|trip|walk)"
+COMMANDS = [
+    ("cancel", re.compile(rf"(cancel|stop|end|quit)( {ROUTE})?|(cancel|stop|end|quit) .*\b{ROUTE}")),
+    ("repeat", re.compile(r"repeat( that| it| the (last )?(instruction|step|direction))?|say (that|it) again"
+                          r"|what (was that|did you say)|what was the last (instruction|step|direction)")),
+    ("status", re.compile(rf"status|are we there( yet)?|how (far|long|much further|much longer)"
+                          rf"( is it| to go| left| now| do i have)*( (to|on|for) {ROUTE}| to (the|my) destination)?"
+                          rf"|where am i on {ROUTE}|(what is |what's )?(the )?next (step|turn)")),
+]
+FILLER = re.compile(r"^(please |ok |okay |hey )+|( please| now)+$")
+
+
+def match_command(query):
+    query = " ".join(re.findall(r"[a-z']+", query.lower()))
+    query = FILLER.sub("", query)
+    for name, pattern in COMMANDS:
+        if pattern.fullmatch(query):
+            return name
+    return None
+
+
+def distance_m(a, b):
+    """
+    Haversine distance in metres between two {"lat", "lng"} points.
+    """
+    lat1, lat2 = math.radians(a["lat"]), math.radians(b["lat"])
+    dlat = lat2 - lat1
+    dlng = math.radians(b["lng"] - a["lng"])
+    h = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(h))
+
+
+class Navigator:
+    """
+    Speaks a route in the background so the agent is free for other queries.
+
+    Announcements are scheduled on a timer heap served by one daemon thread.
+    In "time" mode each step is announced after the previous step's duration
+    (as the old blocking loop did). In "location" mode steps advance when a
+    location update lands within `arrival_radius` metres of the step's end;
+    with a `locate()` function the navigator polls it every `poll_interval`
+    seconds, and update_location() accepts positions from anywhere else.
+    """
+
+    def __init__(self, play, locate=None, advance="time", arrival_radius=25, poll_interval=5):
+        self.play = play
+        self.locate = locate
+        self.advance = advance
+        self.arrival_radius = arrival_radius
+        self.poll_interval = poll_interval
+        self._timers = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._route = None
+        self._generation = 0
+        threading.Thread(target=self._run, name="navigator", daemon=True).start()
+
+    # Timer heap
+
+    def _schedule(self, delay, fn):
+        with self._cond:
+            heapq.heappush(self._timers, (time.monotonic() + delay, next(self._order), fn))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._timers or self._timers[0][0] > time.monotonic():
+                    timeout = self._timers[0][0] - time.monotonic() if self._timers else None
+                    self._cond.wait(timeout)
+                _, _, fn = heapq.heappop(self._timers)
+            try:
+                fn()
+            except Exception as e:
+                log.error("Navigation error: %s", e)
+
+    # Route control
+
+    @property
+    def active(self):
+        return self._route is not None
+
+    def start(self, destination, steps):
+        """
+        Begin guidance. `steps` are dicts with "instruction", "duration" (s),
+        "distance" (m), "end_location" and "audio" (a future of the clip).
+        Returns immediately; the first step is spoken on the navigator thread.
+        """
+        with self._cond:
+            self._generation += 1
+            generation = self._generation
+            self._route = {"destination": destination, "steps": steps, "index": -1,
+                           "started": time.monotonic(), "step_started": None}
+        self._schedule(0, lambda: self._next(generation))
+        if self.advance == "location" and self.locate is not None:
+            self._schedule(self.poll_interval, lambda: self._poll(generation))
+
+    def _current(self, generation):
+        with self._cond:
+            return self._route if generation == self._generation else None
+
+    def _say(self, step):
+        audio = step["audio"].result() if step.get("audio") is not None else None
+        if audio is not None:
+            self.play(audio)
+
+    def _next(self, generation):
+        route = self._current(generation)
+        if route is None:
+            return
+        with self._cond:
+            route["index"] += 1
+            index = route["index"]
+            if index >= len(route["steps"]):
+                self._route = None
+                log.info("Navigation to %s finished", route["destination"])
+                return
+            route["step_started"] = time.monotonic()
+        step = route["steps"][index]
+        log.info("Step %d/%d: %s", index + 1, len(route["steps"]), step["instruction"])
+        # Schedule the next step first, so a failed clip can't stall the route
+        if self.advance == "time":
+            self._schedule(step["duration"], lambda: self._next(generation))
+        try:
+            self._say(step)
+        except Exception as e:
+            log.error("Could not speak step %d: %s", index + 1, e)
+
+    def _poll(self, generation):
+        if self._current(generation) is None:
+            return
+        # Keep polling through a failed lookup; the next one may succeed
+        self._schedule(self.poll_interval, lambda: self._poll(generation))
+        location = self.locate()
+        if location:
+            self.update_location(location["lat"], location["lng"])
+
+    def update_location(self, lat, lng):
+        """
+        Advance when the user reaches the end of the current step.
+        """
+        with self._cond:
+            route, generation = self._route, self._generation
+            if route is None or route["index"] < 0 or self.advance != "location":
+                return
+            end = route["steps"][route["index"]].get("end_location")
+        if end and distance_m({"lat": lat, "lng": lng}, end) <= self.arrival_radius:
+            self._schedule(0, lambda: self._next(generation))
+
+    def cancel(self):
+        with self._cond:
+            route = self._route
+            self._generation += 1
+            self._route = None
+            # Drop pending announcements of the old route
+            self._timers = []
+        return route is not None
+
+    def repeat(self):
+        with self._cond:
+            route = self._route
+            if route is None or route["index"] < 0:
+                return False
+            step = route["steps"][route["index"]]
+        self._say(step)
+        return True
+
+    def status(self):
+        """
+        One spoken sentence describing progress along the active route.
+        """
+        with self._cond:
+            route = self._route
+            if route is None:
+                return "No navigation is active."
+            index = max(route["index"], 0)
+            steps = route["steps"]
+            elapsed = time.monotonic() - (route["step_started"] or route["started"])
+        remaining = max(0, steps[index]["duration"] - elapsed) + sum(s["duration"] for s in steps[index + 1:])
+        minutes = max(1, round(remaining / 60))
+        return (f"Step {index + 1} of {len(steps)} to {route['destination']}: {steps[index]['instruction']}. "
+                f"About {minutes} minute{'s' if minutes != 1 else ''} to go.")
+
+    def handle(self, command):
+        """
+        Run a spoken control command; returns the reply to speak, if any.
+        """
+        if command == "cancel":
+            return "Navigation cancelled." if self.cancel() else "No navigation is active."
+        if command == "repeat":
+            return None if self.repeat() else "There is no instruction to repeat."
+        return self.status()
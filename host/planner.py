@@ -0,0 +1,164 @@
+import json
+import logging
+import re
+from clients import get_openai
+from dotenv import load_dotenv
+from reasoning import image_parts
+from executor import DagExecutor
+from tracing import traced
+
+log = logging.getLogger(__name__)
+
+load_dotenv()
+
+PLAN_INSTRUCTIONS = """You are an AI assistant helping a user navigate and understand their environment. Plan ALL the actions needed to answer the user's query at once, based on the provided images and the query.
+
+Available actions:
+- get_current_location() -> "lat,lng" of the user
+- get_nearby_places(location, type, radius=5000) -> "name, address" of the closest place of that type
+  type is a Google place type, e.g. 'restaurant', 'gas_station', 'hospital', 'store', 'park', 'cafe', 'bank', 'atm', 'pharmacy', 'lodging', 'school'
+- get_route_to_destination(origin, destination) -> starts speaking walking directions to the user in the background
+
+Give every step an "id". An argument may refer to the output of an earlier step as "$<id>".
+Steps that don't refer to each other run in parallel, so give independent lookups (e.g. several place types) their own steps.
+
+Respond with a single JSON object and nothing else:
+{"steps": [{"id": "...", "call": "...", "args": {...}}], "answer": null}
+
+If the query can be answered from the images alone (describing the surroundings, reading text, ...), return no steps and put the answer in "answer".
+
+Example for 'directions to the nearest park':
+{"steps": [
+  {"id": "loc", "call": "get_current_location", "args": {}},
+  {"id": "park", "call": "get_nearby_places", "args": {"location": "$loc", "type": "park"}},
+  {"id": "route", "call": "get_route_to_destination", "args": {"origin": "$loc", "destination": "$park"}}
+], "answer": null}
+"""
+
+REF = re.compile(r"^\$(\w+)$")
+
+
+def _location(actions):
+    location = actions.get_current_location()
+    return f"{location['lat']},{location['lng']}"
+
+
+def _nearby(actions, location, type="restaurant", radius=5000):
+    lat, lng = location.split(",")
+    places = actions.get_nearby_places((float(lat), float(lng)), type, int(radius))
+    results = places.get("results", []) if places else []
+    if not results:
+        return f"No {type} found nearby"
+    return f"{results[0].get('name', 'Unknown name')}, {results[0].get('vicinity', 'Unknown address')}"
+
+
+def _route(actions, origin, destination, mode="walking"):
+    actions.get_route_to_destination(origin, destination)
+    return f"Route from {origin} to {destination} has been calculated. Directions are being provided."
+
+
+# Per-call timeouts in seconds. Routing hands the walk to the navigator and returns once the route is fetched.
+TIMEOUTS = {
+    "get_current_location": 10,
+    "get_nearby_places": 10,
+    "get_route_to_destination": 15,
+}
+
+# Plan call name -> (adapter, required arguments, optional arguments)
+TOOLS = {
+    "get_current_location": (_location, set(), set()),
+    "get_nearby_places": (_nearby, {"location"}, {"type", "radius"}),
+    "get_route_to_destination": (_route, {"origin", "destination"}, {"mode"}),
+}
+
+
+@traced("reasoning.plan")
+def make_plan(images, query, client=None):
+    """
+    Ask the model for the whole action plan in one round trip.
+    """
+    client = client or get_openai()
+    messages = [
+        {"role": "system", "content": PLAN_INSTRUCTIONS},
+        {"role": "user", "content": [{"type": "text", "text": "User Query: " + query}] + image_parts(images)},
+    ]
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=messages,
+        max_tokens=1000,
+        temperature=0.2,
+        response_format={"type": "json_object"},
+    )
+    plan = json.loads(response.choices[0].message.content)
+    validate_plan(plan)
+    return plan
+
+
+def validate_plan(plan):
+    """
+    Raise ValueError unless every step calls a known action with known
+    arguments and only references steps that come before it.
+    """
+    if not isinstance(plan, dict) or not isinstance(plan.get("steps", []), list):
+        raise ValueError(f"Malformed plan: {plan}")
+    seen = set()
+    for step in plan.get("steps", []):
+        if not isinstance(step, dict):
+            raise ValueError(f"Malformed step: {step}")
+        step_id, call, args = step.get("id"), step.get("call"), step.get("args", {})
+        if not step_id or step_id in seen:
+            raise ValueError(f"Missing or duplicate step id: {step}")
+        if call not in TOOLS:
+            raise ValueError(f"Unknown action: {call}")
+        _, required, optional = TOOLS[call]
+        if not isinstance(args, dict) or required - set(args) or set(args) - required - optional:
+            raise ValueError(f"Bad arguments for {call}: {args}")
+        for value in args.values():
+            ref = REF.match(str(value))
+            if ref and ref.group(1) not in seen:
+                raise ValueError(f"Step {step_id} refers to unknown step ${ref.group(1)}")
+        seen.add(step_id)
+    if not plan.get("steps") and not plan.get("answer"):
+        raise ValueError("Plan has neither steps nor an answer")
+
+
+def resolve_args(args, outputs):
+    resolved = {}
+    for name, value in args.items():
+        ref = REF.match(str(value))
+        resolved[name] = outputs[ref.group(1)] if ref else value
+    return resolved
+
+
+def dependencies(step):
+    # Ids of the earlier steps whose outputs this step's arguments refer to.
+    refs = (REF.match(str(value)) for value in step.get("args", {}).values())
+    return {ref.group(1) for ref in refs if ref}
+
+
+@traced("actions")
+def execute_plan(plan, actions, executor=None):
+    """
+    Run a validated plan locally, substituting "$id" references with earlier
+    step outputs. No further model calls are made; steps that don't depend
+    on each other run concurrently.
+
+    Returns {step id: output string}. Raises the first step error, if any.
+    """
+    executor = executor or DagExecutor()
+
+    def node(step):
+        adapter = TOOLS[step["call"]][0]
+
+        def run(inputs):
+            args = resolve_args(step.get("args", {}), inputs)
+            log.debug("Executing %s: %s(%s)", step["id"], step["call"], args)
+            return adapter(actions, **args)
+
+        return {"fn": run, "deps": dependencies(step), "timeout": TIMEOUTS[step["call"]]}
+
+    outputs, errors = executor.run({step["id"]: node(step) for step in plan.get("steps", [])})
+    for step in plan.get("steps", []):
+        if step["id"] in errors:
+            raise errors[step["id"]]
+    return outputs
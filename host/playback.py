@@ -0,0 +1,229 @@
+import io
+import itertools
+import threading
+import numpy as np
+import sounddevice as sd
+import soundfile as sf
+from audio import resample
+
+
+class Clip:
+    """
+    One utterance in the playback queue. PCM can be appended while it is
+    already playing; close() marks the end of the data. `format` says how
+    appended bytes are read: "pcm" (raw s16le) or "mp3" (whole file).
+    """
+
+    def __init__(self, priority, order, format="pcm"):
+        self.priority = priority
+        self.order = order
+        self.format = format
+        self.chunks = []
+        self.offset = 0
+        self.samples_played = 0
+        self.starved = False
+        self.carry = b""
+        self.closed = False
+        self.cancelled = False
+        self.started = threading.Event()
+        self.done = threading.Event()
+
+    def pending(self):
+        return sum(len(chunk) for chunk in self.chunks) - self.offset
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+
+class PlaybackEngine:
+    """
+    Long-lived output stream with a priority queue of clips.
+
+    The device is opened once, so an utterance costs neither player startup
+    nor device open. Higher priority clips play first; preempt=True cuts off
+    whatever is playing or queued at a lower or equal priority (barge-in).
+    duck() lowers the volume with a short ramp, e.g. while the user talks.
+    stop() bumps `generation`, so producers feeding several clips (like a
+    streamed answer) can tell they were interrupted.
+    """
+
+    def __init__(self, fs=24000, channels=1, blocksize=480, ramp=0.02):
+        self.fs = fs
+        self.channels = channels
+        self.gain = 1.0
+        self.target_gain = 1.0
+        self.ramp_step = 1.0 / max(1, int(ramp * fs))
+        self.underruns = 0
+        self.played = 0
+        self.generation = 0
+        self._queue = []
+        self._current = None
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self.stream = sd.OutputStream(samplerate=fs, channels=channels, dtype="float32",
+                                      blocksize=blocksize, callback=self._callback)
+        self.stream.start()
+
+    def _to_pcm(self, clip, audio, fs=None):
+        if isinstance(audio, (bytes, bytearray)):
+            if clip.format == "mp3":
+                # Whole MP3 clip: decode it once.
+                samples, fs = sf.read(io.BytesIO(audio), dtype="float32")
+            else:
+                # Raw little-endian 16 bit PCM at the engine rate (ElevenLabs pcm_* formats).
+                # Network chunks can split a sample, so carry an odd byte over.
+                data = clip.carry + bytes(audio)
+                usable = len(data) - len(data) % 2
+                clip.carry = data[usable:]
+                samples = np.frombuffer(data[:usable], dtype="<i2").astype(np.float32) / 32768
+        else:
+            samples = np.asarray(audio, dtype=np.float32)
+        if samples.ndim > 1:
+            samples = samples.mean(axis=1)
+        if fs is not None and fs != self.fs:
+            samples = resample(samples, fs, self.fs)
+        return samples
+
+    def open_clip(self, priority=0, preempt=False, format="pcm"):
+        """
+        Start a clip that will be filled with append(); returns the Clip.
+        """
+        clip = Clip(priority, next(self._order), format)
+        with self._lock:
+            if preempt:
+                victims = [c for c in self._queue if c.priority <= priority]
+                if self._current is not None and self._current.priority <= priority:
+                    victims.append(self._current)
+                    self._current = None
+                for victim in victims:
+                    self._finish(victim, cancelled=True)
+                self._queue = [c for c in self._queue if c not in victims]
+            self._queue.append(clip)
+            self._queue.sort(key=lambda c: (-c.priority, c.order))
+        return clip
+
+    def append(self, clip, audio, fs=None):
+        samples = self._to_pcm(clip, audio, fs)
+        with self._lock:
+            if not clip.cancelled and len(samples):
+                clip.chunks.append(samples)
+                clip.starved = False
+
+    def close_clip(self, clip):
+        with self._lock:
+            clip.closed = True
+            if clip is not self._current and clip in self._queue and clip.pending() == 0:
+                self._queue.remove(clip)
+                self._finish(clip)
+
+    def play(self, audio, priority=0, preempt=False, fs=None, wait=True, format="pcm"):
+        """
+        Queue a whole clip (PCM array, raw PCM bytes or MP3 bytes).
+        """
+        clip = self.open_clip(priority, preempt, format)
+        self.append(clip, audio, fs)
+        self.close_clip(clip)
+        if wait:
+            clip.wait()
+        return clip
+
+    def stream_chunks(self, chunks, priority=0, preempt=False, fs=None, format="pcm"):
+        """
+        Play audio chunks as they arrive (e.g. straight from a TTS response).
+        """
+        clip = self.open_clip(priority, preempt, format)
+        if format == "mp3":
+            # A partial MP3 can't be decoded on its own: play it once complete
+            chunks = [b"".join(chunks)]
+        try:
+            for chunk in chunks:
+                if clip.cancelled:
+                    break
+                self.append(clip, chunk, fs)
+        finally:
+            self.close_clip(clip)
+        clip.wait()
+        return clip
+
+    def stop(self):
+        # Barge-in: drop everything playing or queued.
+        with self._lock:
+            self.generation += 1
+            for clip in self._queue + ([self._current] if self._current else []):
+                self._finish(clip, cancelled=True)
+            self._queue, self._current = [], None
+
+    def duck(self, gain=0.25):
+        self.target_gain = gain
+
+    def unduck(self):
+        self.target_gain = 1.0
+
+    def queue_depth(self):
+        with self._lock:
+            return len(self._queue) + (1 if self._current is not None else 0)
+
+    def stats(self):
+        return {"queue_depth": self.queue_depth(), "underruns": self.underruns, "clips_played": self.played}
+
+    def _finish(self, clip, cancelled=False):
+        clip.cancelled = clip.cancelled or cancelled
+        clip.chunks = []
+        if not cancelled:
+            self.played += 1
+        clip.done.set()
+
+    def _callback(self, outdata, frames, time_info, status):
+        if status.output_underflow:
+            self.underruns += 1
+        out = np.zeros(frames, dtype=np.float32)
+        filled = 0
+        with self._lock:
+            while filled < frames:
+                if self._current is None:
+                    if not self._queue:
+                        break
+                    self._current = self._queue.pop(0)
+                    self._current.started.set()
+                clip = self._current
+                if not clip.chunks:
+                    if clip.closed:
+                        self._finish(clip)
+                        self._current = None
+                        continue
+                    # Streaming clip ran dry mid-utterance before its next chunk arrived.
+                    if clip.samples_played and not clip.starved:
+                        clip.starved = True
+                        self.underruns += 1
+                    break
+                chunk = clip.chunks[0]
+                take = min(frames - filled, len(chunk) - clip.offset)
+                out[filled:filled + take] = chunk[clip.offset:clip.offset + take]
+                filled += take
+                clip.offset += take
+                clip.samples_played += take
+                if clip.offset >= len(chunk):
+                    clip.chunks.pop(0)
+                    clip.offset = 0
+
+        # Ramp towards the target gain to avoid clicks when ducking.
+        if self.gain != self.target_gain or self.gain != 1.0:
+            step = self.ramp_step if self.target_gain > self.gain else -self.ramp_step
+            ramp = self.gain + step * np.arange(1, frames + 1)
+            ramp = np.minimum(ramp, self.target_gain) if step > 0 else np.maximum(ramp, self.target_gain)
+            out *= ramp
+            self.gain = float(ramp[-1])
+        outdata[:] = out.reshape(-1, 1).repeat(self.channels, axis=1)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    # One output stream per process, shared by every query.
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = PlaybackEngine()
+        return _engine
@@ -2,115 +2,196 @@
 # pass into gpt-4o-mini request
 # pass user speech prompt as text in request (query)
 # fetch long term info from vector store
-from openai import OpenAI
-import os
+import logging
+from clients import get_openai
+from tracing import traced
 from dotenv import load_dotenv
 import base64
 
+log = logging.getLogger(__name__)
+
 load_dotenv()
 
 def get_image_base64(image_path):
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode('utf-8')
 
-def reasoning(images, query, param_for_next_action=""):
-    client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-    
-    messages = [
-        {
-            "role": "user",
-            "content": [
-                {
-                    "type": "text", 
-                    "text": 
-                            """You are an AI assistant helping a user navigate and understand their environment. Based on the provided images and user query, determine the next appropriate action to take in the action sequence.
-
-                            Here are the possible actions you can use:
-
-                            1. Get current location
-                            - Function: get_current_location()
-                            - Returns the current GPS coordinates
-                            Use when you need the user's current position for other actions
-
-                            2. Get route to destination
-                            - Function: get_route_to_destination(origin, destination, mode="walking")
-                            Parameters:
-                              - origin: string (GPS coordinates or address)
-                              - destination: string (address or place name)
-                              - mode: string (defaults to 'walking')
-                            Use when the user asks for directions or how to get somewhere specific
-
-                            3. Get nearby places
-                            - Function: get_nearby_places(location, type, radius=5000)
-                            Parameters:
-                              - location: string (GPS coordinates or address)
-                              - type: string (place type, e.g., 'restaurant', 'gas_station', 'hospital', 'store', 'park', 'cafe', 'bank', 'atm', 'pharmacy', 'lodging')
-                              - radius: integer (optional, search radius in meters, default 5000)
-                            Use when the user asks about finding nearby locations of a specific type
-
-                            For image analysis and understanding the surroundings, I will directly analyze the provided images and give detailed descriptions and contextual information without requiring any additional API calls.
-
-                            - A prompt such as 'explain my surroundings' would require visual analysis of the images, and no API calls would be needed.
-                            - A prompt such as 'read me the text on the whiteboard' would require visual analysis of the images, and no API calls would be needed.
-
-                            If this is the start of a new query, determine the full action chain needed and specify the first action to take.
-                            If this is a continuation (param_for_next_action is not empty), use that parameter for the next action in the chain.
-
-                            Examples of different action chains for different contexts:
-                            
-                            - For 'give me directions to the nearest restaurant', the chain would be:
-                              1. get_current_location() -> returns coordinates
-                              2. get_nearby_places(coordinates, 'restaurant') -> returns restaurant address
-                              3. get_route_to_destination(coordinates, restaurant_address)
-
-                            - For 'find the nearest gas station', the chain would be:
-                              1. get_current_location() -> returns coordinates
-                              2. get_nearby_places(coordinates, 'gas_station')
-
-                            - For 'directions to the nearest park', the chain would be:
-                              1. get_current_location() -> returns coordinates
-                              2. get_nearby_places(coordinates, 'park') -> returns park address
-                              3. get_route_to_destination(coordinates, park_address)
-
-                            - For 'where is the closest hospital', the chain would be:
-                              1. get_current_location() -> returns coordinates
-                              2. get_nearby_places(coordinates, 'hospital')
-                              
-                            IMPORTANT: Be sure to follow the specified format strictly and specify the parameters clearly.
-                            
-                            For get_nearby_places, always include the place type based on what the user is looking for.
-                            For get_route_to_destination, always include both origin and destination parameters.
-                            
-                            If you've already obtained coordinates from get_current_location, use these coordinates directly in the next function call.
-                            If you've already obtained a destination address from get_nearby_places, use this address directly in the next function call.
-
-                            Provide your response in this format:
-                            Action Chain: [List the full sequence of actions needed, or specify if only image analysis is needed]
-                            Next Action: [Specify which action to take now and its parameters, or provide image analysis]
-                            Parameter to Save: [Specify what parameter from the response needs to be saved for the next action]
-
-                            Current parameter from previous action: """ + param_for_next_action + """
-                            User Query: """ + query
-                }
-            ]
-        }
-    ]
+
+INSTRUCTIONS = """You are an AI assistant helping a user navigate and understand their environment. Based on the provided images and user query, determine the next appropriate action to take in the action sequence.
+
+Here are the possible actions you can use:
+
+1. Get current location
+- Function: get_current_location()
+- Returns the current GPS coordinates
+Use when you need the user's current position for other actions
+
+2. Get route to destination
+- Function: get_route_to_destination(origin, destination, mode="walking")
+Parameters:
+  - origin: string (GPS coordinates or address)
+  - destination: string (address or place name)
+  - mode: string (defaults to 'walking')
+Use when the user asks for directions or how to get somewhere specific
+
+3. Get nearby places
+- Function: get_nearby_places(location, type, radius=5000)
+Parameters:
+  - location: string (GPS coordinates or address)
+  - type: string (place type, e.g., 'restaurant', 'gas_station', 'hospital', 'store', 'park', 'cafe', 'bank', 'atm', 'pharmacy', 'lodging')
+  - radius: integer (optional, search radius in meters, default 5000)
+Use when the user asks about finding nearby locations of a specific type
+
+For image analysis and understanding the surroundings, I will directly analyze the provided images and give detailed descriptions and contextual information without requiring any additional API calls.
+
+- A prompt such as 'explain my surroundings' would require visual analysis of the images, and no API calls would be needed.
+- A prompt such as 'read me the text on the whiteboard' would require visual analysis of the images, and no API calls would be needed.
+
+If this is the start of a new query, determine the full action chain needed and specify the first action to take.
+If this is a continuation (param_for_next_action is not empty), use that parameter for the next action in the chain.
+
+Examples of different action chains for different contexts:
+
+- For 'give me directions to the nearest restaurant', the chain would be:
+  1. get_current_location() -> returns coordinates
+  2. get_nearby_places(coordinates, 'restaurant') -> returns restaurant address
+  3. get_route_to_destination(coordinates, restaurant_address)
+
+- For 'find the nearest gas station', the chain would be:
+  1. get_current_location() -> returns coordinates
+  2. get_nearby_places(coordinates, 'gas_station')
+
+- For 'directions to the nearest park', the chain would be:
+  1. get_current_location() -> returns coordinates
+  2. get_nearby_places(coordinates, 'park') -> returns park address
+  3. get_route_to_destination(coordinates, park_address)
+
+- For 'where is the closest hospital', the chain would be:
+  1. get_current_location() -> returns coordinates
+  2. get_nearby_places(coordinates, 'hospital')
+
+IMPORTANT: Be sure to follow the specified format strictly and specify the parameters clearly.
+
+For get_nearby_places, always include the place type based on what the user is looking for.
+For get_route_to_destination, always include both origin and destination parameters.
+
+If you've already obtained coordinates from get_current_location, use these coordinates directly in the next function call.
+If you've already obtained a destination address from get_nearby_places, use this address directly in the next function call.
+
+Provide your response in this format:
+Action Chain: [List the full sequence of actions needed, or specify if only image analysis is needed]
+Next Action: [Specify which action to take now and its parameters, or provide image analysis]
+Parameter to Save: [Specify what parameter from the response needs to be saved for the next action]
+"""
+
+
+def _query_text(query, param_for_next_action):
+    return "Current parameter from previous action: " + param_for_next_action + "\nUser Query: " + query
+
+
+def image_parts(images):
+    parts = []
     for base64_image in images:
         try:
-            messages[0]["content"].append({
+            image_url = {}
+            # Images from image_prep.prepare_images carry their own detail level
+            if isinstance(base64_image, dict):
+                image_url["detail"] = base64_image["detail"]
+                base64_image = base64_image["image"]
+            image_url["url"] = f"data:image/jpeg;base64,{base64_image}"
+            parts.append({
                 "type": "image_url",
-                "image_url": {
-                    "url": f"data:image/jpeg;base64,{base64_image}"
-                }
+                "image_url": image_url
             })
         except Exception as e:
-            print(f"Error processing image {base64_image}: {e}")
-    
+            log.warning("Error processing image: %s", e)
+    return parts
+
+
+def _complete(client, messages):
     response = client.chat.completions.create(
-        model="gpt-4o-mini",  
+        model="gpt-4o-mini",
+        messages=messages,
+        max_tokens=1000,
+        temperature=0.2
+    )
+    return response.choices[0].message.content
+
+
+@traced("reasoning")
+def reasoning(images, query, param_for_next_action=""):
+    client = get_openai()
+
+    # The static instructions go first so every call shares the same cacheable prefix
+    messages = [
+        {"role": "system", "content": INSTRUCTIONS},
+        {
+            "role": "user",
+            "content": [{"type": "text", "text": _query_text(query, param_for_next_action)}] + image_parts(images)
+        }
+    ]
+    return _complete(client, messages)
+
+
+ANSWER_INSTRUCTIONS = """You are an AI assistant helping a visually impaired user understand their environment through the provided camera images. Answer the user's query directly, in short plain sentences that will be read aloud. No headings, lists or markdown."""
+
+
+def answer_stream(images, query):
+    """
+    Stream a direct spoken-style answer for an image-analysis query,
+    yielding text deltas as the model generates them.
+    """
+    client = get_openai()
+    messages = [
+        {"role": "system", "content": ANSWER_INSTRUCTIONS},
+        {"role": "user", "content": [{"type": "text", "text": query}] + image_parts(images)}
+    ]
+    stream = client.chat.completions.create(
+        model="gpt-4o-mini",
         messages=messages,
-        max_tokens=1000,       
-        temperature=0.2      
+        max_tokens=1000,
+        temperature=0.2,
+        stream=True
     )
-  
-    return response.choices[0].message.content
\ No newline at end of file
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+class ReasoningSession:
+    """
+    One conversation for a whole action chain.
+
+    The first step sends the instructions, the query and the images. Later
+    steps append the previous reply and a short message with the last action
+    result (or a custom prompt) to the history and send all of it again.
+
+    Trade-off: the images are re-uploaded on every step, so follow-up
+    requests are as large as the first one plus the history. In exchange
+    the instructions and the first message stay a byte-identical prefix
+    that the provider can cache; with the images it clears the 1024-token
+    caching minimum the instructions alone fall short of, so follow-ups are
+    billed and processed mostly as cached input.
+    """
+
+    def __init__(self, images, query):
+        self.client = get_openai()
+        self.images = images
+        self.query = query
+        self.messages = [{"role": "system", "content": INSTRUCTIONS}]
+
+    @traced("reasoning.step")
+    def step(self, param_for_next_action="", prompt=None):
+        if len(self.messages) == 1:
+            text = _query_text(prompt or self.query, param_for_next_action)
+            # Kept byte-identical, images included, so every later step shares
+            # the instructions + first message as its cached prefix.
+            self.messages.append({"role": "user", "content": [{"type": "text", "text": text}] + image_parts(self.images)})
+            reply = _complete(self.client, self.messages)
+        else:
+            text = prompt or f"Result of previous action: {param_for_next_action}\nUser Query: {self.query}"
+            self.messages.append({"role": "user", "content": text})
+            reply = _complete(self.client, self.messages)
+
+        self.messages.append({"role": "assistant", "content": reply})
+        return reply
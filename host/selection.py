@@ -0,0 +1,69 @@
+import logging
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+def frame_signatures(thumbnails):
+    """
+    Stack grayscale thumbnails into an (N, pixels) float matrix, each row
+    mean-centred so a global exposure change alone doesn't count as a new scene.
+    """
+    signatures = np.stack([t.reshape(-1) for t in thumbnails]).astype(np.float32) / 255.0
+    return signatures - signatures.mean(axis=1, keepdims=True)
+
+
+def pairwise_distances(signatures):
+    # Mean absolute difference between every pair of frames, shape (N, N).
+    return np.abs(signatures[:, None, :] - signatures[None, :, :]).mean(axis=2)
+
+
+def select_distinct(snapshot, k=3, threshold=0.03):
+    """
+    Pick up to k mutually distinct frames out of a Buffer.get_snapshot().
+
+    Starts from the newest frame and greedily adds the frame farthest from
+    everything already picked, stopping once the best candidate is closer
+    than `threshold` (so a static scene yields a single frame).
+
+    Returns (selected snapshot entries oldest first, report dict).
+    """
+    if not snapshot:
+        return [], {"candidates": 0, "selected": 0, "bytes_sent": 0, "bytes_saved": 0}
+
+    distances = pairwise_distances(frame_signatures([e["thumbnail"] for e in snapshot]))
+
+    chosen = [len(snapshot) - 1]
+    # Distance from every frame to its nearest already chosen frame.
+    nearest = distances[chosen[0]].copy()
+    while len(chosen) < min(k, len(snapshot)):
+        candidate = int(np.argmax(nearest))
+        if nearest[candidate] < threshold:
+            break
+        chosen.append(candidate)
+        nearest = np.minimum(nearest, distances[candidate])
+
+    chosen.sort()
+    selected = [snapshot[i] for i in chosen]
+
+    # Upload size is the base64 text itself.
+    total = sum(len(e["image"]) for e in snapshot)
+    sent = sum(len(e["image"]) for e in selected)
+    report = {
+        "candidates": len(snapshot),
+        "selected": len(selected),
+        "bytes_sent": sent,
+        "bytes_saved": total - sent,
+    }
+    return selected, report
+
+
+def select_frames(buffer, k=3, threshold=0.03):
+    """
+    Read the buffer once and return its distinct snapshot entries.
+    """
+    selected, report = select_distinct(buffer.get_snapshot(), k, threshold)
+    log.debug("Selected %d of %d frames (%d bytes sent, %d bytes saved)",
+              report["selected"], report["candidates"], report["bytes_sent"], report["bytes_saved"])
+    return selected
+
@@ -0,0 +1,89 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+
+class Speculator:
+    """
+    Runs work at trigger time that the query will probably need, e.g. the
+    current location, while the user is still speaking.
+
+    start() launches a named task for the current round; take() hands its
+    result to whoever needs it (waiting if it is still in flight) and
+    returns None when nothing was speculated or the task failed, so the
+    caller just does the work itself. finish() closes the round and counts
+    whatever was never taken as wasted.
+    """
+
+    def __init__(self, max_workers=2):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculate")
+        self._lock = threading.Lock()
+        self._tasks = {}
+        self.counts = defaultdict(lambda: {"started": 0, "hits": 0, "wasted": 0, "saved": 0.0})
+
+    def start(self, name, fn, *args):
+        def run():
+            began = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                task["duration"] = time.perf_counter() - began
+
+        task = {"started": time.perf_counter(), "duration": None}
+        task["future"] = self._pool.submit(run)
+        with self._lock:
+            self._tasks[name] = task
+            self.counts[name]["started"] += 1
+        return task["future"]
+
+    def take(self, name, timeout=None):
+        with self._lock:
+            task = self._tasks.pop(name, None)
+        if task is None:
+            return None
+        asked = time.perf_counter()
+        try:
+            result = task["future"].result(timeout)
+        except Exception as e:
+            log.warning("Speculative %s failed: %s", name, e)
+            with self._lock:
+                self.counts[name]["wasted"] += 1
+            return None
+        # Latency hidden: all of it if the task had finished, else the part that overlapped
+        saved = task["duration"] if task["duration"] is not None and task["started"] + task["duration"] <= asked \
+            else asked - task["started"]
+        with self._lock:
+            self.counts[name]["hits"] += 1
+            self.counts[name]["saved"] += saved
+        return result
+
+    def finish(self):
+        with self._lock:
+            for name, task in self._tasks.items():
+                task["future"].cancel()
+                self.counts[name]["wasted"] += 1
+            self._tasks = {}
+
+    def stats(self):
+        with self._lock:
+            stats = {}
+            for name, entry in self.counts.items():
+                stats[name] = dict(entry, hit_rate=entry["hits"] / entry["started"] if entry["started"] else 0.0,
+                                   saved=round(entry["saved"], 3))
+            return stats
+
+
+_speculator = None
+_speculator_lock = threading.Lock()
+
+
+def get_speculator():
+    global _speculator
+    with _speculator_lock:
+        if _speculator is None:
+            _speculator = Speculator()
+        return _speculator
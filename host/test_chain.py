@@ -8,18 +8,48 @@ the chain-of-thought reasoning and action execution.
 import os
 import time
 import re
+import logging
 from transcription import transcribe_with_elevenlabs
 import json
-from reasoning import reasoning
+from reasoning import ReasoningSession, answer_stream
+from tts import speak_stream
+from playback import get_engine
 from dotenv import load_dotenv
-from action import Action
+from action import Action, get_navigator
+from navigation import match_command
+from planner import make_plan, execute_plan
+from intent import route, template_plan
+from answer_cache import get_answer_cache
+from vector_memory import get_memory
+from geo_cache import get_maps_cache
+from tracing import span, get_tracer
+
+log = logging.getLogger(__name__)
+
+
+_actions = None
+
+def shared_actions():
+    # One Action (and its API clients) for the life of the process, not one per query
+    global _actions
+    if _actions is None:
+        _actions = Action()
+    return _actions
+
+
+def remember(kind, text):
+    # Long-term memory is best effort; a failed write never breaks a query
+    try:
+        get_memory().add(kind, text, location=get_maps_cache().last_location())
+    except Exception as e:
+        log.warning("Could not store memory: %s", e)
 
 
 def test_chain(images, query):
     load_dotenv()
 
-    actions = Action()
-    print("Inside testcahin")
+    actions = shared_actions()
+    log.debug("Inside testcahin")
 
     def execute_action(action_info, restaurant_address=None):
         if action_info["action_type"] == "image_analysis":
@@ -28,14 +58,14 @@ def test_chain(images, query):
         function_name = action_info["function"]
         params = action_info["parameters"]
         
-        print(f"DEBUG: Function: {function_name}, Parameters: {params}")
+        log.debug("Function: %s, Parameters: %s", function_name, params)
         
         if function_name == "get_current_location":
             try:
                 location = actions.get_current_location()
                 return f"{location['lat']},{location['lng']}"
             except Exception as e:
-                print(f"Error calling get_current_location: {e}")
+                log.error("Error calling get_current_location: %s", e)
                 return "37.7749,-122.4194"
                 
         elif function_name == "get_nearby_places":
@@ -48,10 +78,10 @@ def test_chain(images, query):
                 if isinstance(location_str, str) and ',' in location_str:
                     lat, lng = location_str.split(',')
                     location = (float(lat.strip()), float(lng.strip()))
-                    print(f"Converted location string '{location_str}' to tuple {location}")
+                    log.debug("Converted location string '%s' to tuple %s", location_str, location)
                 else:
                     location = (37.7749, -122.4194)
-                    print(f"Using default location tuple {location}")
+                    log.debug("Using default location tuple %s", location)
                 
                 places_data = actions.get_nearby_places(location, place_type, radius)
                 
@@ -63,7 +93,7 @@ def test_chain(images, query):
                 else:
                     return f"No {place_type} found nearby"
             except Exception as e:
-                print(f"Error calling get_nearby_places: {e}")
+                log.error("Error calling get_nearby_places: %s", e)
                 return f"Error finding nearby {place_type}: {str(e)}"
                 
         elif function_name == "get_route_to_destination":
@@ -71,12 +101,12 @@ def test_chain(images, query):
                 origin = params.get("origin", "")
                 destination = params.get("destination", "")
                 
-                print(f"DEBUG: Origin: {origin}")
-                print(f"DEBUG: Destination: {destination}")
+                log.debug("Origin: %s", origin)
+                log.debug("Destination: %s", destination)
                 
                 if not destination and restaurant_address:
                     destination = restaurant_address
-                    print(f"WARNING: Empty destination parameter. Using passed restaurant address: {destination}")
+                    log.warning("Empty destination parameter. Using passed restaurant address: %s", destination)
                 
                 if not destination:
                     return "Error: No destination provided for route calculation."
@@ -91,7 +121,7 @@ def test_chain(images, query):
                 actions.get_route_to_destination(origin, destination)
                 return f"Route from {origin} to {destination} has been calculated. Directions are being provided."
             except Exception as e:
-                print(f"Error calling get_route_to_destination: {e}")
+                log.error("Error calling get_route_to_destination: %s", e)
                 return f"Error getting directions: {str(e)}"
         else:
             return f"Unknown function: {function_name}"
@@ -119,7 +149,7 @@ def test_chain(images, query):
                         
                 if analysis_content:
                     analysis_text = "\n".join(analysis_content).strip()
-                    print(f"DEBUG: Detected image analysis response with content length: {len(analysis_text)}")
+                    log.debug("Detected image analysis response with content length: %s", len(analysis_text))
                     return {
                         "action_type": "image_analysis",
                         "action_chain": "image_analysis",
@@ -194,19 +224,19 @@ def test_chain(images, query):
             if not function_match and parameters_line:
                 function_name = next_action.strip()
                 params_str = parameters_line
-                print(f"DEBUG: Using split format - function: {function_name}, params: {params_str}")
+                log.debug("Using split format - function: %s, params: %s", function_name, params_str)
             elif function_match:
                 function_name = function_match.group(1)
                 params_str = function_match.group(2)
-                print(f"DEBUG: Using standard format - function: {function_name}, params: {params_str}")
+                log.debug("Using standard format - function: %s, params: %s", function_name, params_str)
             else:
                 function_name_match = re.search(r'(\w+)', next_action)
                 if function_name_match:
                     function_name = function_name_match.group(1)
                     params_str = ""
-                    print(f"DEBUG: Extracted bare function name: {function_name}")
+                    log.debug("Extracted bare function name: %s", function_name)
                 else:
-                    print(f"DEBUG: Could not match function pattern in: {next_action}")
+                    log.debug("Could not match function pattern in: %s", next_action)
                     return None
                 
             params = {}
@@ -320,7 +350,7 @@ def test_chain(images, query):
                     if 'type' not in params:
                         params['type'] = 'restaurant'
                     
-            print(f"DEBUG: Extracted parameters: {params}")
+            log.debug("Extracted parameters: %s", params)
                     
             return {
                 "action_type": "api_call",
@@ -330,8 +360,8 @@ def test_chain(images, query):
                 "parameter_to_save": parameter_to_save.split('(')[0] if '(' in parameter_to_save else parameter_to_save
             }
         except Exception as e:
-            print(f"Error parsing reasoning response: {e}")
-            print(f"Response was: {response}")
+            log.error("Error parsing reasoning response: %s", e)
+            log.debug("Response was: %s", response)
             return None
 
     def determine_next_action(action_chain, executed_functions, context_params):
@@ -358,7 +388,7 @@ def test_chain(images, query):
             steps = action_chain.split("\n")
             action_sequence = [step.strip().split("(")[0].strip() for step in steps if step.strip()]
         
-        print(f"Parsed action sequence: {action_sequence}")
+        log.debug("Parsed action sequence: %s", action_sequence)
         
         for func in action_sequence:
             if func not in executed_functions and func in ["get_current_location", "get_nearby_places", "get_route_to_destination"]:
@@ -375,25 +405,68 @@ def test_chain(images, query):
         return None
 
     def process_query(images, query):
-        print(f"\n\nPROCESSING QUERY: {query}")
-        print("=" * 50)
+        log.info("PROCESSING QUERY: %s", query)
+        log.debug("=" * 50)
     
-        query_lower = query.lower()
-        is_image_analysis = any(keyword in query_lower for keyword in [
-            "analyz", "describ", "explain", "tell me about", "what is", "what's in", 
-            "show me", "identify", "recognize", "interpret", "read", "tell me what", 
-            "scan", "look at", "examine", "codesignal"," surrounding"
-        ])
+        # Status, repeat and cancel for a route that is being spoken in the background
+        navigator = get_navigator()
+        command = match_command(query) if navigator.active else None
+        if command:
+            log.info("Navigation command: %s", command)
+            reply = navigator.handle(command)
+            if reply:
+                actions.tts(reply)
+            return {
+                "final_result": reply or "Repeated the last instruction.",
+                "action_history": [{"action_type": "navigation", "action_chain": command}],
+                "context_params": {"query_type": "navigation", "spoken": True}
+            }
+
+        # One compiled pass over the keyword tables decides whether the model is needed at all
+        intent = route(query)
+        log.info("Intent: %s", intent)
+        is_image_analysis = intent["intent"] == "image_analysis"
+
+        if intent["intent"] == "memory":
+            # "Where did I last see a bench?" is answered from past scenes and places, no images sent
+            answer = get_memory().recall(query, here=get_maps_cache().last_location())
+            log.info("Recalled: %s", answer)
+            actions.tts(answer)
+            return {
+                "final_result": answer,
+                "action_history": [{"action_type": "memory", "action_chain": "recall"}],
+                "context_params": {"query_type": "memory", "spoken": True}
+            }
         
         if is_image_analysis:
-            print("Identified as an image analysis query - skipping API calls")
+            log.debug("Identified as an image analysis query - skipping API calls")
             step_counter = 1
             
-            print(f"\nSTEP {step_counter}: Performing image analysis")
-            response = reasoning(images, query, "")
-            print(f"Model response:\n{response}")
-            
-            analysis = extract_analysis_from_response(response)
+            log.debug("\nSTEP %s: Performing image analysis", step_counter)
+            # Same scene, same question: answer from the cache without calling the model
+            answers = get_answer_cache()
+            analysis = answers.lookup(images, query)
+            if analysis is not None:
+                log.info("Answered from the scene cache")
+                actions.tts(analysis)
+                metrics = {"cached": True}
+            else:
+                # Speak the answer sentence by sentence while the model is still generating it;
+                # a new button press (engine.stop()) cuts off the rest
+                speaker = get_engine()
+                generation = speaker.generation
+                with span("answer"):
+                    analysis, metrics = speak_stream(answer_stream(images, query), actions.synthesize, actions.play,
+                                                     cancelled=lambda: speaker.generation != generation)
+                for name in ("first_token", "first_audio"):
+                    if name in metrics:
+                        get_tracer().record(f"answer.{name}", metrics[name])
+                # Only fresh, complete answers: a cached one is already remembered, a cut-off one is truncated
+                if not metrics.get("cancelled"):
+                    answers.store(images, query, analysis)
+                    remember("scene", analysis)
+            log.debug("Answer cache: %s", answers.stats())
+            log.info("Model response:\n%s", analysis)
             
             action_info = {
                 "action_type": "image_analysis",
@@ -405,7 +478,7 @@ def test_chain(images, query):
             return {
                 "final_result": analysis,
                 "action_history": [action_info],
-                "context_params": {"query_type": "image_analysis"}
+                "context_params": {"query_type": "image_analysis", "spoken": True, "latency": metrics}
             }
         
         param_for_next_action = ""
@@ -416,54 +489,93 @@ def test_chain(images, query):
         executed_functions = set()
         context_params = {}
         
-        place_type = ""  
-        
-        if "restaurant" in query_lower or "food" in query_lower or "eat" in query_lower or "dining" in query_lower:
-            place_type = "restaurant"
-        elif "gas" in query_lower or "fuel" in query_lower:
-            place_type = "gas_station"
-        elif "hospital" in query_lower or "doctor" in query_lower or "medical" in query_lower or "emergency" in query_lower:
-            place_type = "hospital"
-        elif "store" in query_lower or "shop" in query_lower or "mall" in query_lower:
-            place_type = "store"
-        elif "park" in query_lower or "playground" in query_lower or "garden" in query_lower:
-            place_type = "park"
-        elif "hotel" in query_lower or "motel" in query_lower or "place to stay" in query_lower or "lodging" in query_lower:
-            place_type = "lodging"
-        elif "coffee" in query_lower or "cafe" in query_lower:
-            place_type = "cafe"
-        elif "school" in query_lower or "college" in query_lower or "university" in query_lower:
-            place_type = "school"
-        elif "bank" in query_lower or "atm" in query_lower:
-            place_type = "bank"
-        elif "pharmacy" in query_lower or "drugstore" in query_lower:
-            place_type = "pharmacy"
-        else:
-            place_type = "restaurant"
+        # Same priority order as before; restaurant when no place is named
+        place_type = intent["place_type"] or "restaurant"
         
         context_params["place_type"] = place_type
-        print(f"Detected place type: {place_type}")
+        log.debug("Detected place type: %s", place_type)
+
+        # Routine lookups ("nearest pharmacy", "directions to the park") use a fixed plan, no model call.
+        # Otherwise plan the whole chain in one model call and run it locally,
+        # and only fall back to step-by-step reasoning if no usable plan comes back.
+        plan = template_plan(intent)
+        if plan is not None:
+            log.info("Routed locally as %s, skipping the model", intent['intent'])
+        else:
+            try:
+                plan = make_plan(images, query)
+            except Exception as e:
+                log.warning("Could not get an action plan (%s), falling back to step-by-step reasoning", e)
+                plan = None
+
+        if plan is not None:
+            log.info("Action plan: %s", plan)
+            try:
+                outputs = execute_plan(plan, actions)
+                final_result = outputs[plan["steps"][-1]["id"]] if plan["steps"] else plan["answer"]
+            except Exception as e:
+                log.error("Error executing action plan: %s", e)
+                outputs = {}
+                final_result = f"Error executing action plan: {str(e)}"
+
+            if not plan["steps"]:
+                # Answered from the images alone
+                action_history.append({
+                    "action_type": "image_analysis",
+                    "action_chain": "image_analysis",
+                    "analysis": final_result,
+                    "parameter_to_save": "none"
+                })
+            for plan_step in plan["steps"]:
+                action_history.append({
+                    "action_type": "api_call",
+                    "function": plan_step["call"],
+                    "parameters": plan_step.get("args", {}),
+                    "action_chain": " -> ".join(s["call"] for s in plan["steps"]),
+                    "parameter_to_save": plan_step["id"]
+                })
+                if plan_step["id"] in outputs and plan_step["call"] == "get_current_location":
+                    context_params["coordinates"] = outputs[plan_step["id"]]
+                elif plan_step["id"] in outputs and plan_step["call"] == "get_nearby_places":
+                    context_params["destination"] = outputs[plan_step["id"]]
+
+            if "destination" in context_params:
+                remember("place", f"{context_params['place_type']}: {context_params['destination']}")
+
+            log.debug("\n" + "=" * 50)
+            log.info("FINAL RESULT:")
+            log.info("%s", final_result)
+            log.debug("=" * 50)
+            return {
+                "final_result": final_result,
+                "action_history": action_history,
+                "context_params": context_params
+            }
         
-        print(f"\nSTEP {step_counter}: Initial reasoning to determine action chain")
-        response = reasoning(images, query, param_for_next_action)
-        print(f"Reasoning response:\n{response}")
+        # One conversation for the whole chain; every step re-sends the first message, images
+        # included, so the provider can serve that prefix from its cache
+        session = ReasoningSession(images, query)
+
+        log.debug("\nSTEP %s: Initial reasoning to determine action chain", step_counter)
+        response = session.step(param_for_next_action)
+        log.debug("Reasoning response:\n%s", response)
         step_counter += 1
         
         max_steps = 10
         while step_counter < max_steps:
-            print(f"\nSTEP {step_counter}: Parsing reasoning response")
+            log.debug("\nSTEP %s: Parsing reasoning response", step_counter)
             
             action_info = parse_reasoning_response(response)
             
             if not action_info:
-                print("ERROR: Could not parse reasoning response")
+                log.error("Could not parse reasoning response")
                 
                 # Try direct extraction as fallback
-                print("Attempting direct extraction as fallback...")
+                log.debug("Attempting direct extraction as fallback...")
                 function_match = re.search(r'Next Action:\s*([\w_]+)', response)
                 if function_match:
                     function_name = function_match.group(1)
-                    print(f"Extracted function name: {function_name}")
+                    log.debug("Extracted function name: %s", function_name)
                     
                     if function_name == "get_current_location":
                         action_info = {
@@ -501,32 +613,32 @@ def test_chain(images, query):
                     else:
                         break
                     
-                    print(f"Created fallback action info: {action_info}")
+                    log.debug("Created fallback action info: %s", action_info)
                 else:
                     break
                 
             # Store action in history
             action_history.append(action_info)
             
-            print(f"Action determined: {action_info}")
+            log.debug("Action determined: %s", action_info)
             step_counter += 1
             
             # If this is an image analysis, we're done
             if action_info["action_type"] == "image_analysis":
-                print(f"\nSTEP {step_counter}: Performing image analysis (final step)")
+                log.debug("\nSTEP %s: Performing image analysis (final step)", step_counter)
                 final_result = action_info["analysis"]
-                print(f"Analysis result: {final_result}")
+                log.debug("Analysis result: %s", final_result)
                 break
                 
             function_name = action_info["function"]
             
             if function_name in executed_functions:
-                print(f"Function {function_name} has already been executed. Determining next action...")
+                log.debug("Function %s has already been executed. Determining next action...", function_name)
                 
                 next_function = determine_next_action(action_info["action_chain"], executed_functions, context_params)
                 
                 if next_function:
-                    print(f"Progressing to next step in chain: {next_function}")
+                    log.debug("Progressing to next step in chain: %s", next_function)
                     function_name = next_function
                     
                     if function_name == "get_nearby_places":
@@ -553,32 +665,32 @@ def test_chain(images, query):
                         }
             
             # Execute the action
-            print(f"\nSTEP {step_counter}: Executing action: {action_info['function']}")
+            log.debug("\nSTEP %s: Executing action: %s", step_counter, action_info['function'])
             
             if function_name == "get_nearby_places" and "type" not in action_info["parameters"]:
                 action_info["parameters"]["type"] = context_params.get("place_type", "restaurant")
-                print(f"Adding detected place type to parameters: {action_info['parameters']}")
+                log.debug("Adding detected place type to parameters: %s", action_info['parameters'])
        
             if function_name == "get_route_to_destination":
                 if "origin" not in action_info["parameters"] or not action_info["parameters"]["origin"]:
                     action_info["parameters"]["origin"] = context_params.get("coordinates", "")
-                    print(f"Setting missing origin parameter: {action_info['parameters']['origin']}")
+                    log.debug("Setting missing origin parameter: %s", action_info['parameters']['origin'])
                 else:
                     origin = action_info["parameters"]["origin"]
                     coords_match = re.search(r'([\d\.\-]+,[\d\.\-]+)', origin)
                     if coords_match:
                         action_info["parameters"]["origin"] = coords_match.group(1)
-                        print(f"Cleaned up origin parameter: {action_info['parameters']['origin']}")
+                        log.debug("Cleaned up origin parameter: %s", action_info['parameters']['origin'])
                     
                 if "destination" not in action_info["parameters"] or not action_info["parameters"]["destination"]:
                     action_info["parameters"]["destination"] = context_params.get("destination", "")
-                    print(f"Setting missing destination parameter: {action_info['parameters']['destination']}")
+                    log.debug("Setting missing destination parameter: %s", action_info['parameters']['destination'])
                     
                 action_result = execute_action(action_info, context_params.get("destination"))
             else:
                 action_result = execute_action(action_info)
                 
-            print(f"Action result: {action_result}")
+            log.debug("Action result: %s", action_result)
             step_counter += 1
             
             # Mark this function as executed
@@ -593,7 +705,7 @@ def test_chain(images, query):
             # Check if we need another action in the chain
             if not action_info["parameter_to_save"] or action_info["parameter_to_save"].lower() == "none":
                 # This is the last action in the chain
-                print("\nThis was the final action in the chain")
+                log.debug("\nThis was the final action in the chain")
                 final_result = action_result
                 break
                 
@@ -601,14 +713,14 @@ def test_chain(images, query):
             if "coordinates" in context_params and "destination" in context_params:
                 next_function = determine_next_action(action_info["action_chain"], executed_functions, context_params)
                 if next_function == "get_route_to_destination":
-                    print(f"We have all necessary parameters. Using custom prompt to guide to get_route_to_destination...")
+                    log.debug("We have all necessary parameters. Using custom prompt to guide to get_route_to_destination...")
                     
                     # Get the coordinates and destination
                     coordinates = context_params.get("coordinates", "")
                     destination = context_params.get("destination", "")
                     
-                    print(f"Using coordinates: {coordinates}")
-                    print(f"Using destination: {destination}")
+                    log.debug("Using coordinates: %s", coordinates)
+                    log.debug("Using destination: %s", destination)
                     
                     # Create a modified prompt to guide the model
                     custom_prompt = f"""Based on the previous steps, we have:
@@ -621,33 +733,33 @@ def test_chain(images, query):
     Action Chain: get_route_to_destination
     Next Action: get_route_to_destination(origin="{coordinates}", destination="{destination}")
     Parameter to Save: None"""
-                    response = reasoning(images, custom_prompt, param_for_next_action)
-                    print(f"Custom reasoning response:\n{response}")
+                    response = session.step(param_for_next_action, prompt=custom_prompt)
+                    log.debug("Custom reasoning response:\n%s", response)
                     continue
                 elif next_function is None:
                     # We've completed all actions in the chain
-                    print("All actions in the chain have been completed")
+                    log.debug("All actions in the chain have been completed")
                     final_result = action_result
                     break
             
-            print(f"Parameter to save for next action: {action_info['parameter_to_save']}")    
+            log.debug("Parameter to save for next action: %s", action_info['parameter_to_save'])
             param_for_next_action = action_result
-            print(f"\nSTEP {step_counter}: Calling reasoning again with parameter: {param_for_next_action}")
-            response = reasoning(images, query, param_for_next_action)
-            print(f"Next reasoning response:\n{response}")
+            log.debug("\nSTEP %s: Calling reasoning again with parameter: %s", step_counter, param_for_next_action)
+            response = session.step(param_for_next_action)
+            log.debug("Next reasoning response:\n%s", response)
             step_counter += 1
         
         if step_counter >= max_steps:
-            print("WARNING: Maximum number of steps reached")
+            log.warning("Maximum number of steps reached")
         
             if "coordinates" in context_params and "destination" in context_params and "get_route_to_destination" not in executed_functions:
-                print("Executing final get_route_to_destination as fallback")
+                log.debug("Executing final get_route_to_destination as fallback")
                 
                 origin = context_params["coordinates"]
                 destination = context_params["destination"]
                 
-                print(f"Using coordinates: {origin}")
-                print(f"Using destination: {destination}")
+                log.debug("Using coordinates: %s", origin)
+                log.debug("Using destination: %s", destination)
                 
                 route_action = {
                     "action_type": "api_call",
@@ -662,18 +774,18 @@ def test_chain(images, query):
             else:
                 final_result = "Chain stopped due to exceeding maximum steps"
         
-        print("\n" + "=" * 50)
-        print("FINAL RESULT:")
-        print(final_result)
-        print("=" * 50)
+        log.debug("\n" + "=" * 50)
+        log.info("FINAL RESULT:")
+        log.info("%s", final_result)
+        log.debug("=" * 50)
         
-        print("\nACTION HISTORY:")
+        log.debug("\nACTION HISTORY:")
         for i, action in enumerate(action_history):
-            print(f"  Step {i+1}: {action}")
+            log.debug("  Step %s: %s", i+1, action)
         
-        print("\nCONTEXT PARAMETERS:")
+        log.debug("\nCONTEXT PARAMETERS:")
         for key, value in context_params.items():
-            print(f"  {key}: {value}")
+            log.debug("  %s: %s", key, value)
         
         return {
             "final_result": final_result,
@@ -717,31 +829,33 @@ def test_chain(images, query):
         return response
 
     def main():
-        print("mAin")
+        log.debug("mAin")
         # for image in images:
         #     if not os.path.exists(image):
         #         print(f"ERROR: Image {image} not found")
         #         return
         for test_query in query:
-            print("\n" + "="*70)
-            print("="*70)
+            log.debug("\n" + "="*70)
+            log.debug("="*70)
             
         
             result = process_query(images, test_query)
             
         
             if result:
-                print("\n" + "="*70)
-                print("FINAL RESULT SUMMARY:")
-                print(f"Query: {test_query}")
+                log.debug("\n" + "="*70)
+                log.info("FINAL RESULT SUMMARY:")
+                log.info("Query: %s", test_query)
                 if "image_analysis" in result.get("action_history", [{}])[0].get("action_type", ""):
-                    print(f"Action type: Image Analysis")
-                    print(f"Final result: {result['final_result']}")
-                    actions.tts(result['final_result'])
+                    log.debug("Action type: Image Analysis")
+                    log.info("Final result: %s", result['final_result'])
+                    # Streamed answers have already been spoken
+                    if not result["context_params"].get("spoken"):
+                        actions.tts(result['final_result'])
                 else:
-                    print(f"Detected place type: {result['context_params'].get('place_type', 'unknown')}")
-                    print(f"Final result: {result['final_result']}")
-                print("="*70)
+                    log.debug("Detected place type: %s", result['context_params'].get('place_type', 'unknown'))
+                    log.info("Final result: %s", result['final_result'])
+                log.debug("="*70)
             
             time.sleep(1)  
 
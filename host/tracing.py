@@ -0,0 +1,203 @@
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import defaultdict, deque
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# Durations kept per stage for the percentile summary
+WINDOW = 1000
+
+
+class Tracer:
+    """
+    Per-stage latency spans for the trigger -> frames -> recording -> STT
+    -> reasoning -> actions -> TTS -> playback pipeline.
+
+    span() times a block and nests under the span open on the same thread;
+    start_trace() begins a new trace id for each query. Finished spans feed
+    a rolling window per stage (summary() gives p50/p95/p99) and are handed
+    to a background exporter, so the caller never waits on disk or network:
+    TRACE_FILE appends one JSON span per line, and
+    OTEL_EXPORTER_OTLP_ENDPOINT posts OTLP/HTTP JSON batches to a collector.
+    """
+
+    def __init__(self, path=None, otlp_endpoint=None, service="echovision"):
+        self.path = path
+        self.otlp_endpoint = otlp_endpoint.rstrip("/") if otlp_endpoint else None
+        self.service = service
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._durations = defaultdict(lambda: deque(maxlen=WINDOW))
+        self._trace_id = None
+        self._queue = None
+        if path or self.otlp_endpoint:
+            self._queue = queue.Queue(maxsize=10000)
+            threading.Thread(target=self._export, name="trace-export", daemon=True).start()
+
+    def start_trace(self):
+        self._trace_id = f"{random.getrandbits(128):032x}"
+        return self._trace_id
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def span(self, name, **attributes):
+        return _Span(self, name, attributes)
+
+    def record(self, name, duration, **attributes):
+        """
+        Add a span measured elsewhere, e.g. trigger dispatch time.
+        """
+        end = time.time()
+        self._finish({"name": name, "trace_id": self._trace_id, "span_id": f"{random.getrandbits(64):016x}",
+                      "parent_id": None, "start": end - duration, "duration": duration,
+                      "attributes": attributes, "error": None})
+
+    def _finish(self, span):
+        with self._lock:
+            self._durations[span["name"]].append(span["duration"])
+        if self._queue is not None:
+            try:
+                self._queue.put_nowait(span)
+            except queue.Full:
+                pass
+
+    def summary(self):
+        """
+        {stage: {"count", "p50", "p95", "p99"}} in milliseconds over the last WINDOW spans.
+        """
+        with self._lock:
+            samples = {name: np.array(values) * 1000 for name, values in self._durations.items() if values}
+        return {
+            name: {"count": len(values), "p50": float(np.percentile(values, 50)),
+                   "p95": float(np.percentile(values, 95)), "p99": float(np.percentile(values, 99))}
+            for name, values in samples.items()
+        }
+
+    def log_summary(self, level=logging.INFO):
+        if not log.isEnabledFor(level):
+            return
+        for name, stats in sorted(self.summary().items()):
+            log.log(level, "%-28s n=%-5d p50 %8.1f ms  p95 %8.1f ms  p99 %8.1f ms",
+                    name, stats["count"], stats["p50"], stats["p95"], stats["p99"])
+
+    def _export(self):
+        while True:
+            batch = [self._queue.get()]
+            # Gather whatever else finished meanwhile into one write/post
+            time.sleep(0.5)
+            while not self._queue.empty() and len(batch) < 512:
+                batch.append(self._queue.get_nowait())
+            if self.path:
+                try:
+                    with open(self.path, "a") as f:
+                        f.writelines(json.dumps(span) + "\n" for span in batch)
+                except OSError as e:
+                    log.warning("Could not write spans to %s: %s", self.path, e)
+            if self.otlp_endpoint:
+                self._post_otlp(batch)
+
+    def _post_otlp(self, batch):
+        def attributes(values):
+            return [{"key": k, "value": {"stringValue": str(v)}} for k, v in values.items()]
+
+        spans = []
+        for span in batch:
+            start = int(span["start"] * 1e9)
+            entry = {
+                "traceId": span["trace_id"] or "0" * 32,
+                "spanId": span["span_id"],
+                "name": span["name"],
+                "kind": 1,
+                "startTimeUnixNano": str(start),
+                "endTimeUnixNano": str(start + int(span["duration"] * 1e9)),
+                "attributes": attributes(span["attributes"]),
+                "status": {"code": 2, "message": span["error"]} if span["error"] else {"code": 1},
+            }
+            if span["parent_id"]:
+                entry["parentSpanId"] = span["parent_id"]
+            spans.append(entry)
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": attributes({"service.name": self.service})},
+            "scopeSpans": [{"scope": {"name": "echovision"}, "spans": spans}],
+        }]}
+        try:
+            from clients import get_session
+            get_session().post(f"{self.otlp_endpoint}/v1/traces", json=payload, timeout=5)
+        except Exception as e:
+            log.warning("Could not export spans to %s: %s", self.otlp_endpoint, e)
+
+
+class _Span:
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        self.parent_id = stack[-1].span_id if stack else None
+        self.span_id = f"{random.getrandbits(64):016x}"
+        stack.append(self)
+        self.start = time.time()
+        self.began = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.began
+        stack = self.tracer._stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        self.tracer._finish({
+            "name": self.name, "trace_id": self.tracer._trace_id, "span_id": self.span_id,
+            "parent_id": self.parent_id, "start": self.start, "duration": duration,
+            "attributes": self.attributes, "error": repr(exc) if exc is not None else None,
+        })
+        return False
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer(os.getenv("TRACE_FILE"), os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"))
+        return _tracer
+
+
+def span(name, **attributes):
+    return get_tracer().span(name, **attributes)
+
+
+def traced(name):
+    """
+    Decorator form of span() for whole functions.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def configure_logging():
+    # LOG_LEVEL=DEBUG brings back the step-by-step chain output
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
@@ -1,14 +1,31 @@
+import base64
+import logging
 import os
+import json
+import queue
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
 # import speech_recognition as sr
-import requests
+import numpy as np
 from dotenv import load_dotenv
+from websockets.exceptions import WebSocketException
+from websockets.sync.client import connect
+from audio import encode_for_upload, StreamResampler
+from clients import get_session
+from tracing import traced
+
+log = logging.getLogger(__name__)
 
 load_dotenv()
 
-def transcribe_with_elevenlabs(audio_file_path):
+STREAMING_STT_URL = "wss://api.elevenlabs.io/v1/speech-to-text/realtime"
+
+@traced("stt.upload")
+def transcribe_bytes(data, filename="audio.wav", mime="audio/wav"):
     api_key = os.getenv("ELEVEL_LABS_API_KEY")
     if not api_key:
-        print("Error: ELEVENLABS_API_KEY environment variable is not set.")
+        log.error("ELEVENLABS_API_KEY environment variable is not set.")
         return None
 
     # Endpoint and required parameters based on Eleven Labs API docs.
@@ -16,23 +33,157 @@ def transcribe_with_elevenlabs(audio_file_path):
     headers = {
         "xi-api-key": api_key,
     }
-    data = {
+    data_fields = {
         "model_id": "scribe_v1",  # required model identifier
         # Optionally, include language_code if known, e.g. "en"
         "language_code": "en"
     }
-    # Send the file as a multipart form.
-    with open(audio_file_path, "rb") as audio_file:
-        files = {"file": audio_file}
-        response = requests.post(url, headers=headers, data=data, files=files)
+    # Send the audio as a multipart form straight from memory.
+    files = {"file": (filename, data, mime)}
+    response = get_session().post(url, headers=headers, data=data_fields, files=files)
 
     if response.status_code != 200:
-        print("Error in transcription:", response.text)
+        log.error("Error in transcription: %s", response.text)
         return None
 
     result = response.json()
     return result.get("text", None)
 
+def transcribe_with_elevenlabs(audio_file_path):
+    with open(audio_file_path, "rb") as audio_file:
+        return transcribe_bytes(audio_file.read(), os.path.basename(audio_file_path))
+
+def transcribe_recording(recording, fs, codec="flac"):
+    """
+    Transcribe a recorded array without touching the disk: downmixed,
+    resampled to 16 kHz and compressed before upload.
+    """
+    data, filename, mime = encode_for_upload(recording, fs, codec=codec)
+    log.debug("Uploading %d bytes for transcription", len(data))
+    return transcribe_bytes(data, filename, mime)
+
+class StreamingTranscriber:
+    """
+    Streams audio to ElevenLabs realtime speech-to-text while it is being
+    recorded, so most of the STT time hides behind the recording itself.
+
+    Protocol (WebSocket, /v1/speech-to-text/realtime): 16 kHz mono s16le PCM
+    goes up as {"message_type": "input_audio_chunk", "audio_base_64": ...}
+    messages; the server answers with "partial_transcript" messages as it
+    goes, and with a "committed_transcript" once the last chunk is sent with
+    "commit": true. STREAMING_STT_URL points it at another server speaking
+    the same protocol, e.g. fake_stt_server.py. The API key is only sent to
+    an ElevenLabs wss:// host or a loopback address.
+    """
+
+    def __init__(self, url=None, fs=44100, target_fs=16000, on_partial=None, chunk_duration=0.1,
+                 model_id="scribe_v2_realtime", language_code="en"):
+        self.url = url or os.getenv("STREAMING_STT_URL") or STREAMING_STT_URL
+        self.api_key = os.getenv("ELEVEL_LABS_API_KEY")
+        self.target_fs = target_fs
+        self.params = {"model_id": model_id, "audio_format": f"pcm_{target_fs}",
+                       "commit_strategy": "manual", "language_code": language_code}
+        self.resampler = StreamResampler(fs, target_fs)
+        self.on_partial = on_partial
+        self.chunk_samples = int(target_fs * chunk_duration)
+        self.partial = ""
+        self.final = None
+        self.error = None
+        self.bytes_sent = 0
+        self._pending = []
+        self._pending_samples = 0
+        self._chunks = queue.Queue()
+        self._done = threading.Event()
+
+    def start(self):
+        parts = urlsplit(self.url)
+        trusted = (parts.scheme == "wss" and (parts.hostname or "").endswith(".elevenlabs.io")
+                   or parts.hostname in ("localhost", "127.0.0.1", "::1"))
+        if not trusted:
+            raise OSError(f"Refusing to send the ElevenLabs key to {parts.hostname}")
+        headers = {"xi-api-key": self.api_key} if self.api_key else {}
+        url = f"{self.url}{'&' if parts.query else '?'}{urlencode(self.params)}"
+        try:
+            self._ws = connect(url, additional_headers=headers, open_timeout=5)
+        except (WebSocketException, TimeoutError) as e:
+            raise OSError(f"Streaming STT connection failed: {e}") from e
+        threading.Thread(target=self._send_loop, name="stt-send", daemon=True).start()
+        threading.Thread(target=self._read_loop, name="stt-read", daemon=True).start()
+        return self
+
+    def send(self, block):
+        """
+        Queue a block of recorded audio (any rate/channels given to __init__).
+        Cheap enough to call from the recording loop.
+        """
+        samples = self.resampler.process(block)
+        self._pending.append(samples)
+        self._pending_samples += len(samples)
+        if self._pending_samples >= self.chunk_samples:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        samples = np.concatenate(self._pending)
+        self._pending, self._pending_samples = [], 0
+        pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+        self._chunks.put(pcm)
+
+    def _send_loop(self):
+        try:
+            while True:
+                pcm = self._chunks.get()
+                # None marks the end of speech: commit whatever the server has buffered
+                self._ws.send(json.dumps({
+                    "message_type": "input_audio_chunk",
+                    "audio_base_64": base64.b64encode(pcm or b"").decode("ascii"),
+                    "commit": pcm is None,
+                    "sample_rate": self.target_fs,
+                }))
+                if pcm is None:
+                    return
+                self.bytes_sent += len(pcm)
+        except (WebSocketException, OSError) as e:
+            self.error = e
+            self._done.set()
+
+    def _read_loop(self):
+        try:
+            for raw in self._ws:
+                message = json.loads(raw)
+                kind = message.get("message_type")
+                if kind == "partial_transcript":
+                    self.partial = message.get("text", "")
+                    if self.on_partial:
+                        self.on_partial(self.partial)
+                elif kind == "committed_transcript":
+                    self.final = message.get("text", "")
+                    break
+                elif kind not in ("session_started", "committed_transcript_with_timestamps"):
+                    # auth_error, quota_exceeded, input_error, ... all carry "error"
+                    raise RuntimeError(f"Streaming STT {kind}: {message.get('error', message)}")
+        except Exception as e:
+            self.error = e
+        finally:
+            self._done.set()
+
+    def finish(self, timeout=10):
+        """
+        Commit the stream and wait for the final transcript.
+        """
+        self._flush()
+        self._chunks.put(None)
+        finished = time.perf_counter()
+        self._done.wait(timeout)
+        self._ws.close()
+        if self.error is not None or self.final is None:
+            log.error("Error in streaming transcription: %s", self.error or "no final transcript")
+            return None
+        log.debug("Streamed %d bytes; final transcript %.0f ms after end of speech",
+                  self.bytes_sent, (time.perf_counter() - finished) * 1000)
+        return self.final
+
 def main():
     pass
 #     recognizer = sr.Recognizer()
@@ -0,0 +1,228 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# inotify event masks (linux/inotify.h)
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+EVENT_HEADER = struct.Struct("iIII")
+
+log = logging.getLogger(__name__)
+
+
+class TriggerHub:
+    """
+    Collects triggers from any number of sources and wakes the agent.
+
+    fire() only sets a flag and an Event, so dispatch takes microseconds.
+    Triggers that arrive while a query is running collapse into a single
+    pending trigger instead of queueing one query each.
+    """
+
+    def __init__(self, on_fire=None):
+        # on_fire(source) runs on the firing thread and must return quickly
+        self.on_fire = on_fire
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._source = None
+        self._fired_at = None
+        self.coalesced = 0
+        self.dispatch_latency = 0.0
+        self.sources = []
+
+    def add(self, source):
+        source.start(self)
+        self.sources.append(source)
+        return source
+
+    def fire(self, source):
+        if self.on_fire is not None:
+            self.on_fire(source)
+        with self._lock:
+            if self._event.is_set():
+                self.coalesced += 1
+                return
+            self._source = source
+            self._fired_at = time.perf_counter()
+            self._event.set()
+
+    def wait(self, timeout=None):
+        """
+        Block until a trigger arrives and consume it. Returns the name of the
+        source, or None on timeout.
+        """
+        if not self._event.wait(timeout):
+            return None
+        with self._lock:
+            self._event.clear()
+            source, fired_at = self._source, self._fired_at
+        self.dispatch_latency = time.perf_counter() - fired_at
+        log.debug("Trigger from %s dispatched in %.3f ms", source, self.dispatch_latency * 1000)
+        return source
+
+    def close(self):
+        for source in self.sources:
+            source.close()
+
+
+class FileTrigger:
+    """
+    Fires when the trigger file appears, then removes it (the old mic.txt
+    button). Watches the directory with inotify; falls back to polling where
+    inotify isn't available.
+    """
+
+    def __init__(self, path="mic.txt", poll_interval=0.05):
+        self.path = os.path.abspath(path)
+        self.poll_interval = poll_interval
+        self._closed = False
+
+    def start(self, hub):
+        self.hub = hub
+        # A trigger file left over from before we started still counts.
+        self._consume()
+        target = self._watch_inotify if self._inotify_fd() is not None else self._watch_polling
+        threading.Thread(target=target, name="file-trigger", daemon=True).start()
+
+    def _inotify_fd(self):
+        if hasattr(self, "_fd"):
+            return self._fd
+        self._fd = None
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            return None
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            return None
+        fd = libc.inotify_init1(os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        mask = IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE
+        if libc.inotify_add_watch(fd, os.path.dirname(self.path).encode(), mask) < 0:
+            os.close(fd)
+            return None
+        self._fd = fd
+        return fd
+
+    def _consume(self):
+        try:
+            # Remove the file to avoid re-triggering
+            os.remove(self.path)
+        except FileNotFoundError:
+            return
+        self.hub.fire(f"file {os.path.basename(self.path)}")
+
+    def _watch_inotify(self):
+        name = os.path.basename(self.path).encode()
+        while not self._closed:
+            try:
+                data = os.read(self._fd, 4096)
+            except OSError:
+                return
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+                event_name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+                offset += EVENT_HEADER.size + length
+                if event_name == name:
+                    self._consume()
+
+    def _watch_polling(self):
+        while not self._closed:
+            if os.path.exists(self.path):
+                self._consume()
+            time.sleep(self.poll_interval)
+
+    def close(self):
+        self._closed = True
+        if getattr(self, "_fd", None) is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class SocketTrigger:
+    """
+    Fires on every connection to a Unix domain socket, e.g.
+    `echo | nc -U /tmp/echovision.sock`.
+    """
+
+    def __init__(self, path="/tmp/echovision.sock"):
+        self.path = path
+        self._sock = None
+
+    def start(self, hub):
+        self.hub = hub
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.path)
+        self._sock.listen()
+        threading.Thread(target=self._serve, name="socket-trigger", daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            self.hub.fire(f"socket {self.path}")
+            conn.close()
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class HttpTrigger:
+    """
+    Small HTTP endpoint for the device button: GET or POST /trigger.
+    """
+
+    def __init__(self, host="0.0.0.0", port=8000):
+        self.host = host
+        self.port = port
+        self._server = None
+
+    def start(self, hub):
+        self.hub = hub
+        trigger = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self):
+                if self.path.rstrip("/") != "/trigger":
+                    self.send_error(404)
+                    return
+                trigger.hub.fire(f"http {self.client_address[0]}")
+                self.send_response(202)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            do_GET = _handle
+            do_POST = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="http-trigger", daemon=True).start()
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
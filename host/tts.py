@@ -1,4 +1,135 @@
+import logging
+import queue
+import re
+import threading
+import time
 
+log = logging.getLogger(__name__)
 
+# A sentence ends at . ! or ? followed by whitespace (the next sentence has started).
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
 
 
+class SentenceSplitter:
+    """
+    Cuts streamed text into sentences as soon as each one is complete.
+    Very short pieces ("Yes.") are held back and merged with the next one so
+    each TTS request carries a useful amount of speech.
+    """
+
+    def __init__(self, min_length=20, max_length=250):
+        self.min_length = min_length
+        self.max_length = max_length
+        self.text = ""
+
+    def feed(self, delta):
+        self.text += delta
+        sentences = []
+        while True:
+            cut = None
+            for match in SENTENCE_END.finditer(self.text):
+                if match.start() >= self.min_length:
+                    cut = match
+                    break
+            if cut is None and len(self.text) > self.max_length:
+                # Run-on sentence: break at the last comma or space instead.
+                split_at = max(self.text.rfind(", ", 0, self.max_length), self.text.rfind(" ", 0, self.max_length))
+                if split_at > 0:
+                    sentences.append(self.text[:split_at + 1].strip())
+                    self.text = self.text[split_at + 1:]
+                    continue
+            if cut is None:
+                return sentences
+            sentences.append(self.text[:cut.start()].strip())
+            self.text = self.text[cut.end():]
+
+    def flush(self):
+        rest, self.text = self.text.strip(), ""
+        return [rest] if rest else []
+
+
+def speak_stream(deltas, synthesize, play, cancelled=None):
+    """
+    Speak a streamed answer sentence by sentence.
+
+    Three stages run concurrently: reading `deltas` and cutting sentences,
+    synthesize(sentence) -> audio, and play(audio). Speech starts once the
+    first sentence is generated and synthesized, instead of after the whole
+    answer. Once cancelled() returns True (barge-in), generation stops and
+    whatever is still queued is dropped instead of spoken.
+
+    Returns (text so far, metrics) with first_token, first_sentence,
+    first_audio (time-to-first-audio) and total, in seconds from the start;
+    metrics["cancelled"] is set if the answer was cut off.
+    """
+    start = time.perf_counter()
+    metrics = {}
+    sentences = queue.Queue()
+    clips = queue.Queue()
+    text = []
+
+    def mark(name):
+        metrics.setdefault(name, time.perf_counter() - start)
+
+    def stopped():
+        if cancelled is not None and cancelled():
+            metrics["cancelled"] = True
+        return metrics.get("cancelled", False)
+
+    def synthesizer():
+        while True:
+            sentence = sentences.get()
+            if sentence is None:
+                clips.put(None)
+                return
+            if stopped():
+                continue
+            try:
+                clips.put(synthesize(sentence))
+            except Exception as e:
+                log.error("Error synthesizing %r: %s", sentence, e)
+
+    def player():
+        while True:
+            clip = clips.get()
+            if clip is None:
+                return
+            if stopped():
+                continue
+            mark("first_audio")
+            try:
+                play(clip)
+            except Exception as e:
+                log.error("Error playing audio: %s", e)
+
+    threads = [threading.Thread(target=synthesizer, name="tts-synthesize", daemon=True),
+               threading.Thread(target=player, name="tts-play", daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    splitter = SentenceSplitter()
+    try:
+        for delta in deltas:
+            if stopped():
+                # Stop generating too, not just speaking
+                getattr(deltas, "close", lambda: None)()
+                break
+            mark("first_token")
+            text.append(delta)
+            for sentence in splitter.feed(delta):
+                mark("first_sentence")
+                sentences.put(sentence)
+        if not stopped():
+            for sentence in splitter.flush():
+                mark("first_sentence")
+                sentences.put(sentence)
+    finally:
+        sentences.put(None)
+        for thread in threads:
+            thread.join()
+
+    metrics["total"] = time.perf_counter() - start
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Streamed answer: %s%s", ", ".join(f"{name} {value:.2f}s" for name, value in metrics.items()
+                                                     if name != "cancelled"), " (cancelled)" if stopped() else "")
+    return "".join(text), metrics
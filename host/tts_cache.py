@@ -0,0 +1,104 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+def phrase_key(text, voice_id, model_id, output_format):
+    # Content address: the same words in the same voice always map to the same audio
+    raw = "\0".join([voice_id, model_id, output_format, text.strip()])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class PhraseCache:
+    """
+    Synthesized audio keyed by phrase_key(), LRU in memory and on disk.
+
+    The memory tier holds the most recent `max_items` clips. Every clip is
+    also written to `directory` so common phrases ("Head north", "Turn
+    left onto ...") survive restarts; the disk tier evicts the least
+    recently used files (by mtime) once it exceeds `max_disk_bytes`.
+    """
+
+    def __init__(self, directory=".tts_cache", max_items=256, max_disk_bytes=50_000_000):
+        self.directory = directory
+        self.max_items = max_items
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".pcm")
+
+    def get(self, key):
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return audio
+        if self.directory:
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    audio = f.read()
+                os.utime(path)
+            except FileNotFoundError:
+                audio = None
+            if audio is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._remember(key, audio)
+                return audio
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, audio):
+        if not audio:
+            return
+        self._remember(key, audio)
+        if self.directory:
+            path = self._path(key)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(audio)
+            os.replace(tmp, path)
+            self._evict_disk()
+
+    def _remember(self, key, audio):
+        with self._lock:
+            self._memory[key] = audio
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pcm"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            return {"memory_hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "memory_items": len(self._memory)}
@@ -0,0 +1,262 @@
+import json
+import os
+import re
+import threading
+import time
+import zlib
+import numpy as np
+from navigation import distance_m
+
+DIM = 256
+TOKEN = re.compile(r"[a-z0-9']+")
+# Function words and question phrasing carry no content for retrieval
+STOPWORDS = {
+    "a", "an", "the", "i", "we", "me", "my", "our", "you", "it", "is", "are", "was", "were", "did", "do",
+    "does", "where", "what", "which", "when", "last", "see", "saw", "seen", "pass", "passed", "remember",
+    "to", "of", "in", "on", "at", "by", "with", "and", "or", "that", "this", "there", "next", "near",
+    "any", "some", "anything", "something", "your", "how", "long", "ago", "before", "again", "earlier",
+}
+SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+
+def content_words(text):
+    return [word for word in TOKEN.findall(text.lower()) if word not in STOPWORDS]
+
+
+def _same_word(a, b):
+    # "bench"/"benches", "car"/"cars"
+    if min(len(a), len(b)) < 3:
+        return a == b
+    return a.startswith(b) or b.startswith(a)
+
+
+def overlap(words, text):
+    """
+    Share of `words` found in `text`.
+    """
+    if not words:
+        return 0.0
+    found = content_words(text)
+    return sum(any(_same_word(word, other) for other in found) for word in words) / len(words)
+
+
+def _ago(seconds):
+    minutes = int(seconds / 60)
+    if minutes < 1:
+        return "just now"
+    for size, unit in ((1440, "day"), (60, "hour"), (1, "minute")):
+        if minutes >= size:
+            count = minutes // size
+            return f"{count} {unit}{'s' if count != 1 else ''} ago"
+
+
+def embed(texts, dim=DIM):
+    """
+    Local text embedding by feature hashing: every word and every character
+    trigram of it is hashed into one of `dim` signed buckets, then each row
+    is L2-normalised. No model and no network, and "bench"/"benches" still
+    land close together. Returns a float32 (len(texts), dim) matrix.
+    """
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in TOKEN.findall(text.lower()):
+            if word in STOPWORDS:
+                continue
+            padded = f"<{word}>"
+            features = [word] + [padded[i:i + 3] for i in range(len(padded) - 2)]
+            for feature in features:
+                h = zlib.crc32(feature.encode())
+                vectors[row, h % dim] += 1.0 if h & 0x80000000 else -1.0
+            # Whole words count for more than their trigrams
+            vectors[row, zlib.crc32(word.encode()) % dim] += 2.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-6)
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest neighbour index over unit vectors:
+    spherical k-means centroids, one id list per centroid, and a query
+    scores only the ids in its `nprobe` closest lists.
+    """
+
+    def __init__(self, nprobe=8, iterations=10, sample=20000, seed=0):
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.sample = sample
+        self.rng = np.random.default_rng(seed)
+        self.centroids = None
+        self.lists = []
+        self.trained_on = 0
+
+    def train(self, vectors):
+        n = len(vectors)
+        nlist = max(1, int(np.sqrt(n)))
+        sample = vectors[self.rng.choice(n, min(n, self.sample), replace=False)]
+        centroids = sample[self.rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            # An empty cluster keeps its old centroid
+            filled = np.bincount(assign, minlength=nlist) > 0
+            centroids[filled] = sums[filled]
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-6)
+        self.centroids = centroids
+        self.lists = [[] for _ in range(nlist)]
+        self.trained_on = n
+        self.add(np.arange(n), vectors)
+
+    def add(self, ids, vectors):
+        # Assign in blocks so a large rebuild doesn't allocate an (n, nlist) matrix at once
+        for start in range(0, len(ids), 8192):
+            assign = np.argmax(vectors[start:start + 8192] @ self.centroids.T, axis=1)
+            for i, c in zip(ids[start:start + 8192], assign):
+                self.lists[c].append(int(i))
+
+    def candidates(self, query):
+        probes = np.argsort(-(self.centroids @ query))[:self.nprobe]
+        ids = [self.lists[c] for c in probes if self.lists[c]]
+        return np.concatenate([np.asarray(i) for i in ids]) if ids else np.empty(0, dtype=np.int64)
+
+
+class VectorMemory:
+    """
+    Long-term memory of what the user saw, asked and visited.
+
+    Each entry is a timestamped text ("scene", "answer" or "place") with an
+    optional location. Embeddings live in a float32 matrix memory-mapped
+    from `directory`/vectors.f32 (grown by doubling), the entries
+    themselves in entries.jsonl next to it. Up to `exact_below` entries a
+    search scans every vector; past that an IVF index is trained and
+    retrained whenever the memory has doubled since.
+    """
+
+    def __init__(self, directory=".memory", dim=DIM, exact_below=5000, nprobe=8):
+        self.directory = directory
+        self.dim = dim
+        self.exact_below = exact_below
+        self.index = IVFIndex(nprobe=nprobe)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._entries_path = os.path.join(directory, "entries.jsonl")
+        self.entries = []
+        if os.path.exists(self._entries_path):
+            with open(self._entries_path) as f:
+                self.entries = [json.loads(line) for line in f if line.strip()]
+        self.count = len(self.entries)
+        capacity = max(1024, self.count)
+        if os.path.exists(self._vectors_path):
+            capacity = max(capacity, os.path.getsize(self._vectors_path) // (4 * dim))
+        self._open(capacity)
+        self._entries_file = open(self._entries_path, "a")
+        if self.count >= exact_below:
+            self.index.train(self.vectors[:self.count])
+
+    def _open(self, capacity):
+        mode = "r+" if os.path.exists(self._vectors_path) else "w+"
+        if mode == "r+" and os.path.getsize(self._vectors_path) < capacity * self.dim * 4:
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(capacity * self.dim * 4)
+        self.vectors = np.memmap(self._vectors_path, dtype=np.float32, mode=mode, shape=(capacity, self.dim))
+        self.capacity = capacity
+
+    def add_many(self, kind, texts, timestamp=None, location=None, extra=None):
+        """
+        Store several entries of one kind; returns their ids.
+        """
+        if not texts:
+            return []
+        vectors = embed(texts, self.dim)
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            start = self.count
+            if start + len(texts) > self.capacity:
+                self.vectors.flush()
+                self._open(max(self.capacity * 2, start + len(texts)))
+            self.vectors[start:start + len(texts)] = vectors
+            for text in texts:
+                entry = {"kind": kind, "text": text, "time": timestamp, "location": location}
+                if extra:
+                    entry.update(extra)
+                self.entries.append(entry)
+                self._entries_file.write(json.dumps(entry) + "\n")
+            self._entries_file.flush()
+            self.count += len(texts)
+            ids = np.arange(start, self.count)
+            if self.count >= self.exact_below:
+                if self.index.centroids is None or self.count >= 2 * self.index.trained_on:
+                    self.index.train(self.vectors[:self.count])
+                else:
+                    self.index.add(ids, vectors)
+        return list(ids)
+
+    def add(self, kind, text, **args):
+        return self.add_many(kind, [text], **args)[0]
+
+    def search(self, query, k=5, kind=None, min_score=0.2):
+        """
+        The k entries closest to `query` as (score, entry) pairs, best first.
+        """
+        q = embed([query], self.dim)[0]
+        with self._lock:
+            if self.count == 0:
+                return []
+            if self.index.centroids is not None:
+                ids = self.index.candidates(q)
+                ids = ids[ids < self.count]
+                scores = self.vectors[ids] @ q
+            else:
+                ids = np.arange(self.count)
+                scores = self.vectors[:self.count] @ q
+            if kind is not None:
+                keep = np.array([self.entries[i]["kind"] == kind for i in ids], dtype=bool)
+                ids, scores = ids[keep], scores[keep]
+            top = np.argsort(-scores)[:k]
+            return [(float(scores[i]), self.entries[ids[i]]) for i in top if scores[i] >= min_score]
+
+    def recall(self, question, k=10, here=None):
+        """
+        Spoken answer to "where did I last see ..."-style questions: among
+        the close matches, the most recent one wins. Says when, how far from
+        `here` ({"lat", "lng"}) if both places are known, and only the
+        sentence of the memory that mentions the thing asked about.
+        """
+        words = content_words(question)
+        # Short questions score close to hash-collision noise, so a hit must
+        # also contain most of the question's words
+        hits = [hit for hit in self.search(question, k=k) if overlap(words, hit[1]["text"]) > 0.5]
+        if not hits:
+            return "I don't remember anything like that."
+        # Close runners-up count as the same thing; of those, the latest sighting wins
+        close = [hit for hit in hits if hit[0] >= 0.8 * hits[0][0]]
+        best = max(close, key=lambda hit: hit[1]["time"])[1]
+        snippet = max(SENTENCE.split(best["text"].strip()), key=lambda sentence: overlap(words, sentence))
+        where = ""
+        if here and best.get("location"):
+            metres = distance_m(here, best["location"])
+            if metres < 30:
+                where = ", right around here"
+            elif metres < 1000:
+                where = f", about {int(round(metres, -1))} metres from here"
+            else:
+                where = f", about {metres / 1000:.1f} kilometres from here"
+        return f"{_ago(time.time() - best['time']).capitalize()}{where}: {snippet}"
+
+    def close(self):
+        with self._lock:
+            self.vectors.flush()
+            self._entries_file.close()
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def get_memory():
+    global _memory
+    with _memory_lock:
+        if _memory is None:
+            _memory = VectorMemory(os.getenv("MEMORY_DIR", ".memory"))
+        return _memory